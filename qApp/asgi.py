@@ -3,6 +3,13 @@ ASGI config for qApp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+To serve the async quiz views run it with an ASGI server and the async views
+enabled, for example:
+
+    QUIZ_ASYNC_VIEWS=1 gunicorn qApp.asgi:application -k uvicorn.workers.UvicornWorker
+
+or ``uvicorn qApp.asgi:application`` for a single process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
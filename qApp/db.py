@@ -0,0 +1,66 @@
+"""
+Database profiles.
+
+SQLite serializes writers, with its default rollback journal a quiz ending
+while another one is being written fails right away with "database is
+locked". Every new SQLite connection is tuned by tune_sqlite, which
+QuizConfig.ready() connects to connection_created: WAL lets readers go on
+while a writer commits, busy_timeout makes a writer wait for the lock instead
+of failing, synchronous=NORMAL only syncs at checkpoints (safe under WAL) and
+mmap_size serves reads from the page cache.
+
+Postgres connections are kept open between requests (CONN_MAX_AGE) and
+checked before reuse (CONN_HEALTH_CHECKS), so a worker keeps a small pool of
+one connection per thread that survives database restarts. Behind a
+transaction pooler like PgBouncer set PGBOUNCER=1, server side cursors do not
+survive the transaction.
+"""
+import os
+
+import dj_database_url
+from django.conf import settings
+
+
+def sqlite_profile(name) -> dict:
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+    }
+
+
+def postgres_profile(max_age: int) -> dict:
+    """ DATABASE_URL settings with persistent, health checked connections. """
+    database = dj_database_url.config(
+            conn_max_age=max_age, conn_health_checks=True, ssl_require=True)
+    database.setdefault('OPTIONS', {}).update({
+        'connect_timeout': 5,
+        'keepalives': 1,
+        'keepalives_idle': 30,
+    })
+    if os.environ.get("PGBOUNCER") == "1":
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return database
+
+
+def replica_profiles(urls: str, max_age: int) -> dict[str, dict]:
+    """
+    Settings of the read replicas in a comma separated list of database URLs,
+    under the aliases replica1, replica2... The test runner points them to the
+    test database of the primary.
+    """
+    replicas = {}
+    for n, url in enumerate(filter(None, urls.split(',')), 1):
+        database = dj_database_url.parse(
+                url.strip(), conn_max_age=max_age, conn_health_checks=True)
+        database['TEST'] = {'MIRROR': 'default'}
+        replicas[f'replica{n}'] = database
+    return replicas
+
+
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    for pragma, value in pragmas.items():
+        # straight on the sqlite3 connection, outside of the query log
+        connection.connection.execute(f'PRAGMA {pragma} = {value}')
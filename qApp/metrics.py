@@ -0,0 +1,271 @@
+"""
+Per request performance instrumentation.
+
+PerformanceMiddleware times every request and, through a database execute
+wrapper and the TimedTemplates backend, the queries and the template render
+it needed. The numbers are sent back in a Server-Timing header, so the
+browser devtools show where a slow quiz step spent its time, and aggregated
+per view in in-process histograms that staff users can scrape from
+/metrics in the Prometheus text format.
+
+The body of a streaming response (the large survey pages) is produced after
+the view returned, so the middleware wraps its iterator to keep counting the
+queries and templates of every chunk. The Server-Timing header has already
+been sent by then and only covers the work done up to the first byte, the
+histograms are observed once the stream is exhausted and cover all of it.
+
+The histograms live in the memory of each worker, a scraper must hit every
+worker (or sum them) to get the full picture.
+"""
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+
+@dataclass(slots=True)
+class RequestTimings:
+    queries: int = 0
+    db: float = 0.0
+    template: float = 0.0
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar('request_timings', default=None)
+
+
+class Histogram:
+    """ Cumulative counts over fixed upper bounds, plus the sum and count. """
+
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """ Histograms of every view, shared by the threads of the process. """
+    METRICS = (
+        ('request_duration_seconds', 'Total time spent on the request', SECONDS_BUCKETS),
+        ('db_duration_seconds', 'Time spent on database queries', SECONDS_BUCKETS),
+        ('db_queries', 'Database queries run by the request', QUERIES_BUCKETS),
+        ('template_duration_seconds', 'Time spent rendering templates', SECONDS_BUCKETS),
+    )
+
+    def __init__(self) -> None:
+        self.views: dict[str, dict[str, Histogram]] = {}
+        self.lock = Lock()
+
+    def observe(self, view: str, total: float, timings: RequestTimings) -> None:
+        values = (total, timings.db, timings.queries, timings.template)
+        with self.lock:
+            histograms = self.views.get(view)
+            if histograms is None:
+                histograms = self.views[view] = {
+                    name: Histogram(buckets) for name, _, buckets in self.METRICS}
+            for (name, _, _), value in zip(self.METRICS, values):
+                histograms[name].observe(value)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.views.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, help_text, _ in self.METRICS:
+                metric = f'qapp_{name}'
+                lines.append(f'# HELP {metric} {help_text}.')
+                lines.append(f'# TYPE {metric} histogram')
+                for view, histograms in sorted(self.views.items()):
+                    histogram = histograms[name]
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {count}')
+                    lines.append(f'{metric}_sum{{view="{view}"}} {histogram.sum:.6f}')
+                    lines.append(f'{metric}_count{{view="{view}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def timed_execute(execute, sql, params, many, context):
+    """ Database execute wrapper adding every query to the current request. """
+    timings = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.queries += 1
+            timings.db += time.perf_counter() - start
+
+
+class TimedTemplate:
+    """ Template of the django backend whose render is timed. """
+
+    def __init__(self, template) -> None:
+        self.template_ = template
+
+    def __getattr__(self, name):
+        return getattr(self.template_, name)
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        start = time.perf_counter()
+        try:
+            return self.template_.render(context, request)
+        finally:
+            if timings is not None:
+                timings.template += time.perf_counter() - start
+
+
+class TimedTemplates(DjangoTemplates):
+    """ DjangoTemplates backend that reports the render time of the request. """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+class PerformanceMiddleware:
+    """
+    Time the request, its queries and templates, see the module docstring.
+    Works in both modes, so the async views are not run through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with self.timed_connections():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, start, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with self.timed_connections():
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, start, timings)
+
+    @staticmethod
+    def timed_connections() -> ExitStack:
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timed_execute))
+        return stack
+
+    @staticmethod
+    def finish(request, response, start: float, timings: RequestTimings):
+        total = time.perf_counter() - start
+        response['Server-Timing'] = server_timing(total, timings)
+        view = view_name(request)
+        if not response.streaming:
+            registry.observe(view, total, timings)
+        elif response.is_async:
+            response.streaming_content = atimed_stream(
+                    response.streaming_content, view, start, timings)
+        else:
+            response.streaming_content = timed_stream(
+                    response.streaming_content, view, start, timings)
+        return response
+
+
+def timed_stream(chunks, view: str, start: float, timings: RequestTimings):
+    """ Streamed body whose chunks are still counted into the request. """
+    chunks = iter(chunks)
+    try:
+        while True:
+            token = _current.set(timings)
+            try:
+                with PerformanceMiddleware.timed_connections():
+                    chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        registry.observe(view, time.perf_counter() - start, timings)
+
+
+async def atimed_stream(chunks, view: str, start: float, timings: RequestTimings):
+    """ Async version of timed_stream. """
+    chunks = aiter(chunks)
+    try:
+        while True:
+            token = _current.set(timings)
+            try:
+                with PerformanceMiddleware.timed_connections():
+                    chunk = await anext(chunks)
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        registry.observe(view, time.perf_counter() - start, timings)
+
+
+def server_timing(total: float, timings: RequestTimings) -> str:
+    return ', '.join((
+        f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+        f'tpl;dur={timings.template * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ))
+
+
+def metrics_view(request):
+    """ Aggregated histograms in the Prometheus text format, staff only. """
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,96 @@
+"""
+Primary and read replicas.
+
+Reads go to one of the DATABASE_REPLICAS aliases, writes to the primary
+('default'). Replicas lag behind the primary, so once a request writes, the
+rest of it reads from the primary too, and ReplicaPinningMiddleware pins the
+client to the primary for REPLICA_PIN_SECONDS with a cookie: a player who
+just ended a quiz always sees their own score on the results page. Related
+objects are read from the database of their instance.
+
+Reads that fill a cache, the survey plans, the topic pools and the
+leaderboards, always use the primary: a lagging replica would store stale
+rows under a fresh version, and they would stay wrong until the next write.
+
+Without DATABASE_REPLICAS everything goes to the primary.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pin'
+
+_pinned: ContextVar[bool] = ContextVar('db_pinned', default=False)
+_wrote: ContextVar[bool] = ContextVar('db_wrote', default=False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or _pinned.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keep clients that just wrote on the primary, see the module docstring.
+    Works in both modes, like PerformanceMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            return self.pin(self.get_response(request))
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
+
+    async def __acall__(self, request):
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            return self.pin(await self.get_response(request))
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
+
+    @staticmethod
+    def pin(response):
+        if _wrote.get() and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                    PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True, samesite='Lax')
+        return response
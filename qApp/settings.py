@@ -11,11 +11,12 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 import logging
-import dj_database_url
 import os
 from django.test.runner import DiscoverRunner
 from pathlib import Path
 
+from .db import postgres_profile, replica_profiles, sqlite_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -57,6 +58,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'qApp.metrics.PerformanceMiddleware',
+    'qApp.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -71,7 +74,7 @@ ROOT_URLCONF = 'qApp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'qApp.metrics.TimedTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,6 +89,15 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'qApp.wsgi.application'
+ASGI_APPLICATION = 'qApp.asgi.application'
+
+# Serve the quiz flow with the async views of quiz.async_views, only worth it
+# under an ASGI server, see qApp/asgi.py.
+QUIZ_ASYNC_VIEWS = os.environ.get("QUIZ_ASYNC_VIEWS", "0") == "1"
+
+# Store the answers of finished quizzes from a background thread in batches,
+# see quiz/writebehind.py.
+QUIZ_WRITE_BEHIND = os.environ.get("QUIZ_WRITE_BEHIND", "0") == "1"
 
 
 # Database
@@ -94,10 +106,7 @@ WSGI_APPLICATION = 'qApp.wsgi.application'
 MAX_CONN_AGE = 600
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    },
+    'default': sqlite_profile(BASE_DIR / 'db.sqlite3'),
     # 'default': {
         # 'ENGINE': 'django.db.backends.mysql',
         # 'NAME': credentials.DATABASE_NAME,
@@ -108,15 +117,79 @@ DATABASES = {
     # }
 }
 
+# Applied to every new SQLite connection, see qApp/db.py. SQLITE_TUNING=0
+# keeps the SQLite defaults, to compare with the bench_answers command.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+}
+if os.environ.get("SQLITE_TUNING", "1") == "0":
+    SQLITE_PRAGMAS = {}
+
 if "DATABASE_URL" in os.environ:
     # Configure Django for DATABASE_URL environment variable.
-    DATABASES["default"] = dj_database_url.config(
-            conn_max_age=MAX_CONN_AGE, ssl_require=True)
+    DATABASES["default"] = postgres_profile(MAX_CONN_AGE)
     
     # Enable test database if found in CI environment.
     if "CI" in os.environ:
         DATABASES["default"]["TEST"] = DATABASES["default"]
 
+# Read replicas, e.g. REPLICA_DATABASE_URLS=sqlite:////tmp/replica.sqlite3 to
+# try it locally with a copy of the primary file, see qApp/routers.py.
+DATABASES.update(replica_profiles(
+        os.environ.get("REPLICA_DATABASE_URLS", ""), MAX_CONN_AGE))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['qApp.routers.PrimaryReplicaRouter']
+
+# Seconds a client that wrote keeps reading from the primary.
+REPLICA_PIN_SECONDS = 10
+
+# Cache and sessions
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The quiz keeps plans, pools, leaderboards and games in progress in the
+# cache, with several workers it must be shared, set REDIS_URL for that. The
+# games in progress have their own alias, which must never drop them: LocMem
+# culls past MAX_ENTRIES, so it gets a large one, and a Redis server should run
+# with maxmemory-policy noeviction. The LocMem default only works with a
+# single process: a game step served by another worker would not find its
+# game. With WEB_CONCURRENCY (the gunicorn worker count, set by Heroku) above
+# 1 and no REDIS_URL the workers share a file cache instead, which only
+# reaches the workers of one host, the quiz.W001 check warns about it. Pass
+# the workers that way rather than with gunicorn -w.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'games': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'games',
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    },
+}
+
+if "REDIS_URL" in os.environ:
+    CACHES["default"] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ["REDIS_URL"],
+    }
+    CACHES["games"] = {**CACHES["default"], 'KEY_PREFIX': 'games'}
+elif int(os.environ.get("WEB_CONCURRENCY", "1")) > 1:
+    # In LocMem the survey version stamps that invalidate the cached plans
+    # would only reach the worker that made the change, the others would keep
+    # serving stale questions and answer keys, and games would be lost.
+    CACHE_DIR = Path(os.environ.get("CACHE_DIR", "/tmp/qapp-cache"))
+    for alias, cache in CACHES.items():
+        cache.update({
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR / alias,
+        })
+
+# Sessions are read from the cache and only written through to the database.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
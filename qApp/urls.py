@@ -16,8 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('', include('quiz.urls')),
     path('register/', include('registerUsers.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -1,28 +1,104 @@
 from django.contrib import admin
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.html import format_html
 
 from .models import Question, Choice, Survey
+from .pagination import annotate_counts, count_of
+
+class CappedInlineFormSet(BaseInlineFormSet):
+    """
+    Only the first max_rows related rows are rendered, a survey with hundreds
+    of questions edits the rest from their own changelist.
+    """
+    max_rows = 50
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            self._queryset = super().get_queryset().order_by('id')[:self.max_rows]
+        return self._queryset
 
 class ChoiceInLine(admin.TabularInline):
     model = Choice
-    extra = 4
+    extra = 1
 
 class QuestionInLine(admin.TabularInline):
     model = Question
-    extra = 4
+    formset = CappedInlineFormSet
+    fields = ['question_text']
+    extra = 1
+    show_change_link = True
 
 
 class QuestionAdmin(admin.ModelAdmin):
     fieldsets =  [
-            (None,  {'fields': ['question_text']}),
+            (None,  {'fields': ['survey', 'question_text']}),
             #('Date Information', {'fields': ['pub_date'], 'classes': ['collapse']}),
     ]
-    inlines = [ChoiceInLine]    
+    inlines = [ChoiceInLine]
+    list_display = ['question_text', 'survey', 'choice_count']
+    list_select_related = ['survey']
+    list_filter = ['survey__topic']
+    search_fields = ['question_text']
+    raw_id_fields = ['survey']
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+                choice_count=count_of(Choice, 'question'))
+
+    @admin.display(description='choices', ordering='choice_count')
+    def choice_count(self, question):
+        return question.choice_count
 
 class SurveyAdmin(admin.ModelAdmin):
     fieldsets = [
-            (None, {'fields': ['topic', 'status', 'name']}),
+            (None, {'fields': ['topic', 'status', 'name', 'user', 'creation_date']}),
     ]
     inlines = [QuestionInLine,]
+    list_display = ['name', 'topic', 'status', 'user', 'creation_date',
+            'question_count', 'play_count']
+    list_select_related = ['user']
+    list_filter = ['topic', 'status']
+    search_fields = ['name']
+    autocomplete_fields = ['user']
+    readonly_fields = ['all_questions']
+    show_full_result_count = False
+    actions = ['approve', 'send_to_review']
+
+    def get_queryset(self, request):
+        return annotate_counts(super().get_queryset(request))
+
+    def get_fieldsets(self, request, obj=None):
+        if obj is None:
+            return self.fieldsets
+        return [*self.fieldsets, ('Questions', {'fields': ['all_questions']})]
+
+    @admin.display(description='questions', ordering='question_count')
+    def question_count(self, survey):
+        return survey.question_count
+
+    @admin.display(description='plays', ordering='play_count')
+    def play_count(self, survey):
+        return survey.play_count
+
+    @admin.display(description='all questions')
+    def all_questions(self, survey):
+        url = reverse('admin:quiz_question_changelist')
+        return format_html(
+                '<a href="{}?survey__id__exact={}">{} questions</a> '
+                '(the inline shows the first {})',
+                url, survey.pk, survey.question_count, CappedInlineFormSet.max_rows)
+
+    @admin.action(description='Approve the selected surveys')
+    def approve(self, request, queryset):
+        updated = Survey.set_status(queryset, Survey.StateSurvey.ACCEPTED)
+        self.message_user(request, f"{updated} surveys approved.")
+
+    @admin.action(description='Send the selected surveys back to review')
+    def send_to_review(self, request, queryset):
+        updated = Survey.set_status(queryset, Survey.StateSurvey.REVIEW)
+        self.message_user(request, f"{updated} surveys sent to review.")
 
 admin.site.register(Survey, SurveyAdmin)
 admin.site.register(Question, QuestionAdmin)
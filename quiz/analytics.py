@@ -0,0 +1,160 @@
+"""
+Item analysis of the questions over every recorded attempt.
+
+The responses are read in chunks of whole attempts, ordered by answer, into
+NumPy arrays. Each chunk only adds to a few running sums per question and
+per choice, so the memory depends on the number of questions and on the
+chunk size, never on the number of responses:
+
+    difficulty      share of the attempts that got the question right.
+    discrimination  point biserial correlation between getting the question
+                    right and the rest score of the attempt, the correct
+                    answers to its other questions.
+    pick rate       share of the attempts of the question that picked each
+                    choice, the distractor analysis.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Answer, Choice, ChoiceAnalysis, Question, QuestionAnalysis, QuestionResponse
+
+CHUNK_SIZE = 10000
+
+
+def positions(ids: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Index of each value in the sorted ids, and whether the value is there. """
+    if not len(ids):
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    index = np.searchsorted(ids, values).clip(max=len(ids) - 1)
+    return index, ids[index] == values
+
+
+@dataclass
+class ItemSums:
+    """ Running sums of the responses, aligned with the sorted question and choice ids. """
+    question_ids: np.ndarray
+    choice_ids: np.ndarray
+    choice_questions: np.ndarray
+
+    def __post_init__(self) -> None:
+        n = len(self.question_ids)
+        self.attempts = np.zeros(n)
+        self.correct = np.zeros(n)
+        # rest score of every attempt, of its square and of the correct ones
+        self.rest = np.zeros(n)
+        self.rest_sq = np.zeros(n)
+        self.rest_correct = np.zeros(n)
+        self.picks = np.zeros(len(self.choice_ids))
+        self.choice_question = positions(self.question_ids, self.choice_questions)[0]
+        self.responses = 0
+
+    @staticmethod
+    def for_questions() -> 'ItemSums':
+        choices = np.array(Choice.objects.order_by('id').values_list('id', 'question_id'),
+                dtype=np.int64).reshape(-1, 2)
+        question_ids = np.array(Question.objects.order_by('id').values_list('id', flat=True),
+                dtype=np.int64)
+        # drop the choices of questions created between the two reads
+        choices = choices[positions(question_ids, choices[:, 1])[1]]
+        return ItemSums(question_ids, choices[:, 0], choices[:, 1])
+
+    def add(self, rows: np.ndarray) -> None:
+        """
+        Add a chunk of (answer id, question id, choice id or -1, is correct)
+        rows holding every response of its attempts.
+        """
+        if not len(rows):
+            return
+        self.responses += len(rows)
+        # responses of questions created after the ids were read are ignored
+        q, known = positions(self.question_ids, rows[:, 1])
+        answers, choices, correct = rows[known, 0], rows[known, 2], rows[known, 3]
+        q = q[known]
+
+        _, attempt = np.unique(answers, return_inverse=True)
+        rest = np.bincount(attempt, weights=correct)[attempt] - correct
+
+        n = len(self.question_ids)
+        self.attempts += np.bincount(q, minlength=n)
+        self.correct += np.bincount(q, weights=correct, minlength=n)
+        self.rest += np.bincount(q, weights=rest, minlength=n)
+        self.rest_sq += np.bincount(q, weights=rest * rest, minlength=n)
+        self.rest_correct += np.bincount(q, weights=rest * correct, minlength=n)
+
+        c, known = positions(self.choice_ids, choices)
+        self.picks += np.bincount(c[known], minlength=len(self.choice_ids))
+
+    def metrics(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Difficulty and discrimination per question, pick rate per choice.
+        The discrimination is NaN when every attempt got the same result.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            difficulty = self.correct / self.attempts
+            mean = self.rest / self.attempts
+            mean_correct = self.rest_correct / self.correct
+            std = np.sqrt(np.maximum(self.rest_sq / self.attempts - mean * mean, 0))
+            discrimination = ((mean_correct - mean) / std
+                    * np.sqrt(difficulty / (1 - difficulty)))
+            pick_rate = self.picks / self.attempts[self.choice_question]
+        discrimination[~np.isfinite(discrimination)] = np.nan
+        return np.nan_to_num(difficulty), discrimination, np.nan_to_num(pick_rate)
+
+
+def response_chunks(chunk_size: int = CHUNK_SIZE):
+    """
+    Arrays of the responses of chunk_size attempts at a time, paging on the
+    answer id so every query is an index range scan.
+    """
+    last = 0
+    while True:
+        bounds = (Answer.objects.filter(pk__gt=last).order_by('pk')
+                .values_list('pk', flat=True)[chunk_size - 1:chunk_size])
+        bound = next(iter(bounds), None)
+        responses = QuestionResponse.objects.filter(answer_id__gt=last)
+        if bound is not None:
+            responses = responses.filter(answer_id__lte=bound)
+        rows = responses.order_by().values_list(
+                'answer_id', 'question_id', Coalesce('choice_id', Value(-1)), 'is_correct')
+        yield np.array(list(rows), dtype=np.int64).reshape(-1, 4)
+        if bound is None:
+            return
+        last = bound
+
+
+@transaction.atomic
+def write_analysis(sums: ItemSums) -> int:
+    """ Replace the summary tables with the metrics of the sums. """
+    difficulty, discrimination, pick_rate = sums.metrics()
+    now = timezone.now()
+    QuestionAnalysis.objects.all().delete()
+    ChoiceAnalysis.objects.all().delete()
+
+    analysed = sums.attempts > 0
+    QuestionAnalysis.objects.bulk_create([
+        QuestionAnalysis(question_id=q_id, attempts=attempts, difficulty=p,
+            discrimination=None if np.isnan(r) else r, computed_at=now)
+        for q_id, attempts, p, r in zip(
+            sums.question_ids[analysed].tolist(), sums.attempts[analysed].astype(np.int64).tolist(),
+            difficulty[analysed].tolist(), discrimination[analysed].tolist())],
+        batch_size=1000)
+
+    picked = analysed[sums.choice_question]
+    ChoiceAnalysis.objects.bulk_create([
+        ChoiceAnalysis(choice_id=c_id, pick_rate=rate)
+        for c_id, rate in zip(sums.choice_ids[picked].tolist(), pick_rate[picked].tolist())],
+        batch_size=1000)
+    return int(analysed.sum())
+
+
+def analyze_items(chunk_size: int = CHUNK_SIZE) -> tuple[int, int]:
+    """ Analyse every question, returns the questions and the responses read. """
+    sums = ItemSums.for_questions()
+    for rows in response_chunks(chunk_size):
+        sums.add(rows)
+    return write_analysis(sums), sums.responses
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class QuizConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quiz'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from qApp.db import tune_sqlite
+
+        connection_created.connect(tune_sqlite, dispatch_uid='qApp.db.tune_sqlite')
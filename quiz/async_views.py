@@ -0,0 +1,177 @@
+"""
+Async versions of the quiz flow views, served when QUIZ_ASYNC_VIEWS is set
+and the project runs under an ASGI server (see qApp/asgi.py). They produce
+the same responses as StartView, SurveyView, QuestionView and ResultsView,
+but wait on the cache and the database without holding a worker thread.
+
+Sessions have no async API in this Django version, so the few session reads
+and writes, and the lazy request.user, are run through sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import redirect, render
+from django.views.generic import View
+
+from .games import (
+        GAME_COOKIE,
+        afinish_game,
+        aload_game,
+        anew_game,
+        asave_game,
+        game_token,
+        set_game_cookie,
+        )
+from .models import Answer, ScoreBucket, Survey
+from .plans import QUESTION_TIME, SurveyPlan
+from .pools import arandom_survey_id, warm_topic_pool
+
+
+async def aget_user(request):
+    """ Resolve the lazy user, so templates don't hit the database. """
+    user = request.user
+    await sync_to_async(lambda: user.is_authenticated)()
+    return user
+
+
+async def aget_plan_or_404(survey_id: int) -> SurveyPlan:
+    plan = await Survey.aget_plan(survey_id)
+    if plan is None:
+        raise Http404("Survey not found")
+    return plan
+
+
+class AsyncStartView(View):
+    """ Async StartView. """
+
+    async def get_random_survey_from_topic(self, topic) -> SurveyPlan | None:
+        for _ in range(2):
+            survey_id = await arandom_survey_id(topic)
+            if survey_id is None:
+                return None
+
+            plan = await Survey.aget_plan(survey_id)
+            if (plan is not None and plan.topic == topic
+                    and plan.status == Survey.StateSurvey.ACCEPTED):
+                return plan
+
+            await sync_to_async(warm_topic_pool)(topic)
+        return None
+
+    async def get(self, request, *args, **kwargs):
+        survey = await self.get_random_survey_from_topic(request.POST.get('topic'))
+        if not survey:
+            return redirect("/?failed=1")
+
+        response = redirect('survey', id=survey.survey_id)
+        set_game_cookie(response, await anew_game(survey.survey_id))
+        return response
+
+    async def post(self, request, *args, **kwargs):
+        return await self.get(request, *args, **kwargs)
+
+
+class AsyncSurveyView(View):
+    """ Async SurveyView. """
+
+    async def get(self, request, *args, **kwargs):
+        survey_id = kwargs.get('id')
+        plan = await aget_plan_or_404(survey_id)
+        if not plan.question_ids:
+            raise Http404("Survey not found or without questions")
+
+        game = await aload_game(game_token(request))
+        if game is not None and game.survey_id == survey_id:
+            next_question = game.next_question_id(plan=plan)
+        else:
+            next_question = plan.next_question_id()
+
+        await aget_user(request)
+        context = {'question_url': f"{survey_id}/questions/{next_question}"}
+        return render(request, 'quiz/survey.html', context)
+
+
+class AsyncQuestionView(View):
+    """ Async QuestionView. """
+
+    async def get_plan(self) -> SurveyPlan:
+        plan = await Survey.aget_plan(self.kwargs['s_id'])
+        if plan is None or self.kwargs['q_id'] not in plan:
+            raise Http404("Question not found in survey")
+        return plan
+
+    async def get(self, request, *args, **kwargs):
+        plan = await self.get_plan()
+        game = await aload_game(game_token(request))
+        seed = game.seed if game is not None and game.survey_id == kwargs['s_id'] else None
+
+        question = plan.question(kwargs['q_id'])
+        order = plan.choice_order(question.id, seed)
+        await aget_user(request)
+        context = {
+            'question': question,
+            'choices': [question.choices[i] for i in order],
+            'choice_order': '-'.join(map(str, order)),
+            'question_time': QUESTION_TIME,
+            'survey': plan,
+        }
+        return render(request, 'quiz/quiz.html', context)
+
+    async def post(self, request, *args, **kwargs):
+        survey_id, question_id = kwargs['s_id'], kwargs['q_id']
+        plan = await self.get_plan()
+
+        token = game_token(request)
+        game = await aload_game(token)
+        if game is None or game.survey_id != survey_id:
+            return redirect('index')
+
+        current = game.current_question_id(plan)
+        if current is None:
+            return redirect('index')
+        if current != question_id:
+            return redirect('question', s_id=survey_id, q_id=current)
+
+        choice = int(request.POST.get('choice') or 0)
+        timer = int(request.POST.get('timerVal') or 0)
+        game.play(question_id, choice, timer, plan.score(question_id, choice, timer))
+
+        next_question = game.next_question_id(question_id, plan)
+        if next_question is not None:
+            await asave_game(token, game)
+            return redirect('question', s_id=survey_id, q_id=next_question)
+
+        await afinish_game(token)
+        user = await aget_user(request)
+        if user.is_authenticated:
+            answer = await Answer.arecord(user, survey_id, game.total, game.picks)
+            await sync_to_async(request.session.__setitem__)(
+                    'score_pending', answer.is_pending)
+
+        await sync_to_async(request.session.__setitem__)('score', game.total)
+        response = redirect('results', id=survey_id)
+        response.delete_cookie(GAME_COOKIE)
+        return response
+
+
+class AsyncResultsView(View):
+    """ Async ResultsView. """
+
+    async def get(self, request, *args, **kwargs):
+        survey_id = kwargs.get('id')
+        score = await sync_to_async(request.session.pop)('score', None)
+        pending = await sync_to_async(request.session.pop)('score_pending', False)
+        plan = await aget_plan_or_404(survey_id)
+        if score is None:
+            return redirect('index')
+
+        await aget_user(request)
+        context = {
+            'score': score,
+            'survey': plan,
+            'top5': await Answer.atop_n_answers(5, survey_id),
+            'standing': await ScoreBucket.astanding(
+                score, survey_id=survey_id, pending=pending),
+            'topic_standing': await ScoreBucket.astanding(
+                score, topic=plan.topic, pending=pending),
+        }
+        return render(request, 'quiz/results.html', context)
@@ -0,0 +1,11 @@
+"""
+Helpers shared by the benchmark commands, loadtest and bench_answers.
+"""
+
+
+def percentile(values: list[float], p: float) -> float:
+    """ Nearest rank percentile of already sorted values. """
+    if not values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
@@ -0,0 +1,25 @@
+"""
+System checks of the deployment settings, registered by QuizConfig.ready().
+"""
+import os
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+SHARED_CACHE = 'django.core.cache.backends.redis.RedisCache'
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """ Several workers need a cache they all see, see qApp/settings.py. """
+    if int(os.environ.get('WEB_CONCURRENCY', '1')) <= 1:
+        return []
+    return [
+        Warning(
+            f"WEB_CONCURRENCY is above 1 and the {alias!r} cache is a "
+            f"{config['BACKEND'].rsplit('.', 1)[1]}, which not every worker may see.",
+            hint="Set REDIS_URL, a file cache only reaches the workers of one host "
+                 "and LocMem a single process.",
+            id='quiz.W001')
+        for alias, config in settings.CACHES.items()
+        if config['BACKEND'] != SHARED_CACHE]
@@ -0,0 +1,197 @@
+"""
+Creation of a survey with all its questions and choices.
+
+Both the create-survey form and the JSON endpoint end up here with the same
+dict layout produced by CreateSurveyView.process_request:
+
+    {
+        'survey': {'topic': ..., 'name': ..., 'user': ...},
+        'question-0': {
+            'question_text': ...,
+            'choice-0': {'choice_text': ..., 'is_correct': ...},
+            ...
+        },
+        ...
+    }
+
+The data is validated first and then saved in one transaction, with one
+INSERT for the survey and one bulk INSERT for each of questions and choices.
+"""
+from typing import Any
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Choice, Question, Survey, SurveyCreationKey
+from .plans import bump_survey_version
+from .pools import discard_topic_pool
+
+
+def max_length(model, field: str) -> int:
+    return model._meta.get_field(field).max_length
+
+
+def check_text(errors: list[str], label: str, text: Any, limit: int) -> None:
+    if not isinstance(text, str) or not text.strip():
+        errors.append(f"{label}: text is required")
+    elif len(text) > limit:
+        errors.append(f"{label}: text is longer than {limit} characters")
+
+
+def validate_survey_data(data_form: dict[str, Any]) -> None:
+    """ Raise a ValidationError with every problem found in the data. """
+    errors: list[str] = []
+    survey = data_form['survey']
+    user = survey.get('user')
+
+    if user is None or not user.is_authenticated:
+        errors.append("survey: an authenticated user is required")
+
+    if survey.get('topic') not in Survey.SurveyTopics.values:
+        errors.append(f"survey: unknown topic {survey.get('topic')!r}")
+    elif (survey['topic'] == Survey.SurveyTopics.TEST
+            and not getattr(user, 'is_superuser', False)):
+        errors.append("survey: only admins can create test surveys")
+
+    check_text(errors, 'survey', survey.get('name'), max_length(Survey, 'name'))
+
+    if survey.get('status', Survey.StateSurvey.REVIEW) not in Survey.StateSurvey.values:
+        errors.append(f"survey: unknown status {survey.get('status')!r}")
+
+    questions = [(key, val) for key, val in data_form.items() if 'question' in key]
+    if not questions:
+        errors.append("survey: at least one question is required")
+
+    for key, val in questions:
+        check_text(errors, key, val.get('question_text'),
+                max_length(Question, 'question_text'))
+
+        choices = [(k, v) for k, v in val.items() if 'choice' in k]
+        if not choices:
+            errors.append(f"{key}: at least one choice is required")
+        if sum(bool(v.get('is_correct')) for _, v in choices) > 1:
+            errors.append(f"{key}: only one choice can be correct")
+
+        for key2, val2 in choices:
+            check_text(errors, f"{key}-{key2}", val2.get('choice_text'),
+                    max_length(Choice, 'choice_text'))
+            if len(val2.get('explanation') or '') > max_length(Choice, 'explanation'):
+                errors.append(f"{key}-{key2}: explanation is too long")
+
+    if errors:
+        raise ValidationError(errors)
+
+
+def create_survey(
+        data_form: dict[str, Any],
+        idempotency_key: str | None = None) -> Survey:
+    """
+    Validate the data and create the survey, its questions and choices in a
+    single transaction. If an idempotency key is given it is stored in the
+    same transaction, a concurrent retry fails with IntegrityError.
+    """
+    validate_survey_data(data_form)
+
+    with transaction.atomic():
+        data_form = Survey.from_form(data_form)
+        data_form = Question.from_form(data_form)
+        Choice.from_form(data_form)
+
+        survey = data_form['survey']
+        if idempotency_key:
+            SurveyCreationKey.objects.create(
+                    key=idempotency_key, user=survey.user, survey=survey)
+
+        # bulk_create sends no signals, the plan is stale once committed.
+        transaction.on_commit(lambda: bump_survey_version(survey.pk))
+
+    return survey
+
+
+def create_surveys(data_forms: list[dict[str, Any]]) -> list[Survey]:
+    """
+    Batch version of create_survey used by the import command: three bulk
+    INSERTs for the whole batch. The data must be already validated.
+    """
+    with transaction.atomic():
+        surveys = Survey.objects.bulk_create([
+            Survey(topic = d['survey']['topic'],
+                name = d['survey']['name'],
+                status = d['survey'].get('status', Survey.StateSurvey.REVIEW),
+                creation_date = d['survey'].get('creation_date') or timezone.now(),
+                user = d['survey']['user'])
+            for d in data_forms])
+
+        entries = []
+        for data_form, survey in zip(data_forms, surveys):
+            entries += [(survey, val) for key, val in data_form.items() if 'question' in key]
+        questions = Question.objects.bulk_create([
+            Question(question_text = val['question_text'], survey = survey)
+            for survey, val in entries])
+
+        Choice.objects.bulk_create([
+            Choice(choice_text = val2['choice_text'],
+                explanation = val2.get('explanation', ''),
+                is_correct = val2.get('is_correct', False),
+                question = question)
+            for (_, val), question in zip(entries, questions)
+            for key2, val2 in val.items() if 'choice' in key2])
+
+        def invalidate():
+            for survey in surveys:
+                bump_survey_version(survey.pk)
+            for topic in {survey.topic for survey in surveys}:
+                discard_topic_pool(topic)
+
+        transaction.on_commit(invalidate)
+
+    return surveys
+
+
+def survey_data_from_json(payload: Any, user: User) -> dict[str, Any]:
+    """
+    Convert the JSON layout used by the API and the import command
+
+        {"topic": ..., "name": ..., "questions": [
+            {"question_text": ..., "choices": [
+                {"choice_text": ..., "is_correct": ..., "explanation": ...}]}]}
+
+    into the layout of the form data.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('questions'), list):
+        raise ValidationError("survey: expected an object with a list of questions")
+
+    data_form: dict[str, Any] = {
+        'survey': {
+            'topic': payload.get('topic'),
+            'name': payload.get('name'),
+            'user': user,
+        },
+    }
+    if payload.get('status') is not None:
+        data_form['survey']['status'] = payload['status']
+    if payload.get('creation_date'):
+        creation_date = parse_datetime(str(payload['creation_date']))
+        if creation_date is None:
+            raise ValidationError("survey: creation_date is not an ISO datetime")
+        data_form['survey']['creation_date'] = creation_date
+
+    for i, question in enumerate(payload['questions']):
+        if not isinstance(question, dict) or not isinstance(question.get('choices'), list):
+            raise ValidationError(f"question-{i}: expected an object with a list of choices")
+
+        entry: dict[str, Any] = {'question_text': question.get('question_text')}
+        for j, choice in enumerate(question['choices']):
+            if not isinstance(choice, dict):
+                raise ValidationError(f"question-{i}-choice-{j}: expected an object")
+            entry[f'choice-{j}'] = {
+                'choice_text': choice.get('choice_text'),
+                'is_correct': bool(choice.get('is_correct')),
+                'explanation': choice.get('explanation') or '',
+            }
+        data_form[f'question-{i}'] = entry
+
+    return data_form
@@ -0,0 +1,83 @@
+"""
+Streaming export of the Answer history.
+
+Rows are read with iterator(chunk_size=...), a server side cursor where the
+database supports it, and turned into CSV or JSON lines one at a time, so
+neither the download view nor the export_answers command hold the table in
+memory. Filters are applied in SQL.
+"""
+import csv
+import datetime
+import json
+from typing import Iterable, Iterator
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Answer
+
+EXPORT_CHUNK_SIZE = 2000
+ANSWER_COLUMNS = ('id', 'survey_id', 'topic', 'username', 'score', 'creation_date')
+FORMATS = ('csv', 'jsonl')
+
+
+def parse_moment(value: str) -> datetime.datetime:
+    """ Accept an ISO datetime or a date, naive values use the current timezone. """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{value!r} is not an ISO date or datetime")
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def answers_queryset(
+        survey: int | None = None,
+        topic: str | None = None,
+        since: datetime.datetime | None = None,
+        until: datetime.datetime | None = None):
+    qs = Answer.objects.order_by('id')
+    if survey is not None:
+        qs = qs.filter(survey_id=survey)
+    if topic:
+        qs = qs.filter(survey__topic=topic)
+    if since is not None:
+        qs = qs.filter(creation_date__gte=since)
+    if until is not None:
+        qs = qs.filter(creation_date__lt=until)
+
+    return qs.values_list(
+            'id', 'survey_id', 'survey__topic', 'user__username', 'score',
+            'creation_date')
+
+
+def answer_rows(qs, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    return qs.iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """ File like object for csv.writer that returns the line instead. """
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(ANSWER_COLUMNS)
+    for row in rows:
+        *values, creation_date = row
+        yield writer.writerow([*values, creation_date.isoformat()])
+
+
+def jsonl_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    for row in rows:
+        record = dict(zip(ANSWER_COLUMNS, row))
+        record['creation_date'] = record['creation_date'].isoformat()
+        yield json.dumps(record) + '\n'
+
+
+def export_lines(rows: Iterable[tuple], fmt: str) -> Iterator[str]:
+    return csv_lines(rows) if fmt == 'csv' else jsonl_lines(rows)
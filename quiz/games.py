@@ -0,0 +1,160 @@
+"""
+State of the games in progress.
+
+While a quiz is being played the score of every question is kept in the
+cache under a random token, the token travels in a signed cookie. A quiz step
+only touches the cache, the session (and its database row) is written once,
+when the quiz ends and the final score is stored for the results page. The
+games have a cache of their own, GAME_CACHE: the default cache culls its
+entries as fragments and pools fill it, and a culled game would send its
+player back home. With several workers the cache must be shared (REDIS_URL),
+see qApp/settings.py.
+
+A question bank game has no survey: it plays questions sampled from every
+accepted survey of a topic, see quiz/pools.py, and keeps the (survey id,
+question id) pairs in its state so every step finds the cached plan of the
+survey that owns the question.
+
+The order of the questions and of the choices of a game comes from its seed,
+see SurveyPlan.question_order, and the questions must be answered in that
+order, so every step is checked against it without storing the order.
+"""
+import secrets
+from dataclasses import dataclass, field
+
+from django.core.cache import caches
+
+from .plans import SurveyPlan
+
+GAME_CACHE = 'games'
+GAME_COOKIE = 'quiz_game'
+GAME_TIMEOUT = 60 * 60
+GAME_KEY = 'quiz:game:{}'
+BANK_SIZE = 10
+
+
+def new_seed() -> int:
+    return secrets.randbits(32)
+
+
+@dataclass(slots=True)
+class GameState:
+    # None in a question bank game
+    survey_id: int | None
+    scores: dict[int, int] = field(default_factory=dict)
+    # question id -> (choice id, timer) of the player, see QuestionResponse
+    picks: dict[int, tuple[int, int]] = field(default_factory=dict)
+    # order of the questions and choices, None plays them in the stored order
+    seed: int | None = None
+    topic: str | None = None
+    # (survey id, question id) of the questions of a question bank game
+    questions: tuple[tuple[int, int], ...] = ()
+
+    def play(self, q_id: int, choice_id: int, timer: int, score: int) -> None:
+        self.scores[q_id] = score
+        self.picks[q_id] = (choice_id, timer)
+
+    def to_cache(self) -> tuple:
+        # new items go at the end, the games in progress keep loading
+        return (self.survey_id, tuple(self.scores.items()), tuple(self.picks.items()),
+                self.topic, self.questions, self.seed)
+
+    @staticmethod
+    def from_cache(value: tuple) -> 'GameState':
+        # states saved before the picks, the question bank or the seed lack
+        # their trailing items
+        survey_id, scores, picks, topic, questions, seed = (
+                *value, *((), None, (), None)[len(value) - 2:])
+        return GameState(survey_id, dict(scores), dict(picks), seed, topic, tuple(questions))
+
+    @property
+    def total(self) -> int:
+        return sum(self.scores.values())
+
+    @property
+    def is_bank(self) -> bool:
+        return self.survey_id is None
+
+    def source(self, q_id: int) -> int | None:
+        """ Survey of a question of a bank game, None if it is not in the game. """
+        return next((s_id for s_id, id_ in self.questions if id_ == q_id), None)
+
+    def question_order(self, plan: SurveyPlan | None = None) -> tuple[int, ...]:
+        """
+        Question ids in the order of the game, a bank game keeps its sampled
+        order and a survey game needs the plan of its survey.
+        """
+        if self.is_bank:
+            return tuple(q_id for _, q_id in self.questions)
+        return plan.question_order(self.seed)
+
+    def next_question_id(self, q_id: int | None = None,
+            plan: SurveyPlan | None = None) -> int | None:
+        """ Question of the game after q_id, the first one if q_id is None. """
+        order = self.question_order(plan)
+        idx = 0 if q_id is None else order.index(q_id) + 1
+        return order[idx] if idx < len(order) else None
+
+    def current_question_id(self, plan: SurveyPlan | None = None) -> int | None:
+        """ First question of the game not answered yet, None at the end. """
+        return next((q_id for q_id in self.question_order(plan)
+            if q_id not in self.scores), None)
+
+
+def game_token(request) -> str | None:
+    return request.get_signed_cookie(GAME_COOKIE, default=None, salt=GAME_COOKIE)
+
+
+def set_game_cookie(response, token: str) -> None:
+    response.set_signed_cookie(
+            GAME_COOKIE, token, salt=GAME_COOKIE, max_age=GAME_TIMEOUT,
+            httponly=True, samesite='Lax')
+
+
+def new_game(survey_id: int) -> str:
+    token = secrets.token_urlsafe(16)
+    save_game(token, GameState(survey_id, seed=new_seed()))
+    return token
+
+
+def new_bank_game(topic: str, questions: list[tuple[int, int]]) -> str:
+    token = secrets.token_urlsafe(16)
+    save_game(token, GameState(
+        None, seed=new_seed(), topic=topic, questions=tuple(questions)))
+    return token
+
+
+def load_game(token: str | None) -> GameState | None:
+    if not token:
+        return None
+    value = caches[GAME_CACHE].get(GAME_KEY.format(token))
+    return None if value is None else GameState.from_cache(value)
+
+
+def save_game(token: str, state: GameState) -> None:
+    caches[GAME_CACHE].set(GAME_KEY.format(token), state.to_cache(), GAME_TIMEOUT)
+
+
+def finish_game(token: str) -> None:
+    caches[GAME_CACHE].delete(GAME_KEY.format(token))
+
+
+async def anew_game(survey_id: int) -> str:
+    token = secrets.token_urlsafe(16)
+    await asave_game(token, GameState(survey_id, seed=new_seed()))
+    return token
+
+
+async def aload_game(token: str | None) -> GameState | None:
+    if not token:
+        return None
+    value = await caches[GAME_CACHE].aget(GAME_KEY.format(token))
+    return None if value is None else GameState.from_cache(value)
+
+
+async def asave_game(token: str, state: GameState) -> None:
+    await caches[GAME_CACHE].aset(GAME_KEY.format(token), state.to_cache(), GAME_TIMEOUT)
+
+
+async def afinish_game(token: str) -> None:
+    await caches[GAME_CACHE].adelete(GAME_KEY.format(token))
@@ -0,0 +1,87 @@
+"""
+Bounded per survey leaderboards.
+
+The top scores of a survey are kept in the django cache as a short sorted
+list, so the results page never sorts the Answer table nor fetches the users
+row by row. A cold board is rebuilt with a single query that walks the
+(survey, -score) index. A new answer that enters the board discards it
+rather than merging into it, the board is shared by every worker and a
+read-modify-write would lose concurrent updates. Boards also expire after a
+while, so a board rebuilt from a read that raced a new answer heals by itself.
+"""
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+LEADERBOARD_SIZE = 10
+LEADERBOARD_TIMEOUT = 60 * 60
+LEADERBOARD_KEY = 'quiz:survey:{}:leaderboard'
+
+class LeaderboardEntry(NamedTuple):
+    answer_id: int
+    score: int
+    username: str
+
+    @property
+    def rank_key(self) -> tuple[int, int]:
+        """ Higher scores first, the oldest answer wins a tie. """
+        return (-self.score, self.answer_id)
+
+
+def leaderboard_rows(survey_id: int):
+    from .models import Answer
+
+    return (Answer.objects.using(DEFAULT_DB_ALIAS).filter(survey_id=survey_id)
+            .order_by('-score', 'id')
+            .values_list('id', 'score', 'user__username')[:LEADERBOARD_SIZE])
+
+
+def build_leaderboard(survey_id: int) -> list[LeaderboardEntry]:
+    board = [LeaderboardEntry(a_id, score, username or '')
+            for a_id, score, username in leaderboard_rows(survey_id)]
+    cache.set(LEADERBOARD_KEY.format(survey_id), board, LEADERBOARD_TIMEOUT)
+    return board
+
+
+def top_n(survey_id: int, n: int) -> list[LeaderboardEntry]:
+    board = cache.get(LEADERBOARD_KEY.format(survey_id))
+    if board is None:
+        board = build_leaderboard(survey_id)
+    return board[:min(n, LEADERBOARD_SIZE)]
+
+
+async def atop_n(survey_id: int, n: int) -> list[LeaderboardEntry]:
+    """ Async version of top_n. """
+    key = LEADERBOARD_KEY.format(survey_id)
+    board = await cache.aget(key)
+    if board is None:
+        board = [LeaderboardEntry(a_id, score, username or '')
+                async for a_id, score, username in leaderboard_rows(survey_id)]
+        await cache.aset(key, board, LEADERBOARD_TIMEOUT)
+    return board[:min(n, LEADERBOARD_SIZE)]
+
+
+def record_score(survey_id: int, answer_id: int, score: int, username: str) -> None:
+    """
+    Discard the cached board when the new answer enters it, the next read
+    rebuilds it. A cold board is left alone, it already includes the answer
+    when it is rebuilt.
+    """
+    board = cache.get(LEADERBOARD_KEY.format(survey_id))
+    if board is None:
+        return
+
+    entry = LeaderboardEntry(answer_id, score, username)
+    full = len(board) >= LEADERBOARD_SIZE
+    if full and entry.rank_key >= board[-1].rank_key:
+        return
+    discard_leaderboard(survey_id)
+
+
+def discard_leaderboard(survey_id: int) -> None:
+    cache.delete(LEADERBOARD_KEY.format(survey_id))
+
+
+def discard_leaderboards(survey_ids) -> None:
+    cache.delete_many([LEADERBOARD_KEY.format(s_id) for s_id in survey_ids])
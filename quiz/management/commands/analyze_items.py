@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz.analytics import CHUNK_SIZE, analyze_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the difficulty, the discrimination and the distractor pick "
+        "rates of every question from all the recorded responses, and store "
+        "them in the QuestionAnalysis and ChoiceAnalysis tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                help="attempts read per query")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        questions, responses = analyze_items(options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Analysed {questions} questions from {responses} responses in "
+            f"{elapsed:.2f}s ({responses / elapsed:.0f} rows/s)"))
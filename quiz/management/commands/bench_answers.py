@@ -0,0 +1,100 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, router
+from django.utils import timezone
+
+from quiz.benchmarks import percentile
+from quiz.models import Answer, Survey
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the write throughput of concurrent finished quizzes: every "
+        "thread records answers through Answer.record, as quiz_ended does. "
+        "Run it once per database profile to compare them, e.g. with "
+        "SQLITE_TUNING=0 for the SQLite defaults. It writes to the database, "
+        "so the alias must be given, and removes its user, survey and answers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', required=True,
+                help="alias the answers are written to, it must be the one "
+                     "the router sends Answer writes to")
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--inserts', type=int, default=200,
+                help="answers recorded by each thread")
+        parser.add_argument('--keep', action='store_true',
+                help="keep the benchmark user, survey and answers")
+        parser.add_argument('--json', action='store_true',
+                help="print the report as JSON")
+
+    def handle(self, *args, **options):
+        database = options['database']
+        if database != router.db_for_write(Answer):
+            raise CommandError(
+                    f"Answer.record writes to {router.db_for_write(Answer)!r}, "
+                    f"not to {database!r}")
+        connection = connections[database]
+
+        user, _ = User.objects.db_manager(database).get_or_create(username='bench-answers')
+        survey = Survey.objects.using(database).create(
+                topic=Survey.SurveyTopics.TEST, status=Survey.StateSurvey.ACCEPTED,
+                creation_date=timezone.now(), user=user, name='bench answers')
+
+        def insert(_) -> tuple[list[float], int]:
+            latencies, errors = [], 0
+            try:
+                for _ in range(options['inserts']):
+                    start = time.perf_counter()
+                    try:
+                        Answer.record(user, survey.id, random.randint(0, 100))
+                    except OperationalError:
+                        errors += 1
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connections[database].close()
+            return latencies, errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(insert, range(options['threads'])))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(t for thread, _ in results for t in thread)
+        errors = sum(e for _, e in results)
+        stored = Answer.objects.using(database).filter(survey=survey).count()
+        report = {
+            'vendor': connection.vendor,
+            'settings': self.database_settings(connection),
+            'threads': options['threads'],
+            'attempts': len(latencies),
+            'stored': stored,
+            'errors': errors,
+            'elapsed_s': elapsed,
+            'inserts_per_s': stored / elapsed if elapsed else 0.0,
+            'p50_ms': 1000 * percentile(latencies, 50),
+            'p99_ms': 1000 * percentile(latencies, 99),
+        }
+
+        if not options['keep']:
+            # the survey and its answers go with the user
+            user.delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+        else:
+            for key, value in report.items():
+                self.stdout.write(f"{key:<15}{value}")
+
+    def database_settings(self, connection) -> dict:
+        if connection.vendor != 'sqlite':
+            return {'CONN_MAX_AGE': connection.settings_dict['CONN_MAX_AGE'],
+                    'CONN_HEALTH_CHECKS': connection.settings_dict['CONN_HEALTH_CHECKS']}
+        with connection.cursor() as cursor:
+            return {pragma: cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                    for pragma in ('journal_mode', 'busy_timeout', 'synchronous')}
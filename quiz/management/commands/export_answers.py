@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.exports import (
+        EXPORT_CHUNK_SIZE,
+        FORMATS,
+        answer_rows,
+        answers_queryset,
+        export_lines,
+        parse_moment,
+        )
+
+
+class Command(BaseCommand):
+    help = "Stream the Answer history as CSV or JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                help="file to write, '-' for stdout")
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--survey', type=int)
+        parser.add_argument('--topic')
+        parser.add_argument('--since', help="ISO date or datetime, inclusive")
+        parser.add_argument('--until', help="ISO date or datetime, exclusive")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_moment(options['since']) if options['since'] else None
+            until = parse_moment(options['until']) if options['until'] else None
+        except ValueError as error:
+            raise CommandError(error)
+
+        qs = answers_queryset(options['survey'], options['topic'], since, until)
+        rows = answer_rows(qs, options['chunk_size'])
+        start = time.perf_counter()
+        n = 0
+
+        if options['output'] == '-':
+            for n, line in enumerate(export_lines(rows, options['format']), 1):
+                self.stdout.write(line, ending='')
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for n, line in enumerate(export_lines(rows, options['format']), 1):
+                    output.write(line)
+
+        elapsed = time.perf_counter() - start
+        rows_written = n - 1 if options['format'] == 'csv' else n
+        self.stderr.write(self.style.SUCCESS(
+            f"exported {max(rows_written, 0)} answers in {elapsed:.2f}s"))
@@ -0,0 +1,79 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from quiz.models import Choice, Question, Survey
+
+
+def survey_to_json(survey: Survey) -> dict:
+    """ Layout read back by import_surveys, see quiz.creation. """
+    return {
+        'topic': survey.topic,
+        'name': survey.name,
+        'status': survey.status,
+        'creation_date': survey.creation_date.isoformat(),
+        'user': survey.user.username,
+        'questions': [
+            {
+                'question_text': question.question_text,
+                'choices': [
+                    {
+                        'choice_text': choice.choice_text,
+                        'is_correct': choice.is_correct,
+                        'explanation': choice.explanation,
+                    } for choice in question.choice_set.all()],
+            } for question in survey.question_set.all()],
+    }
+
+
+class Command(BaseCommand):
+    help = "Export surveys with their questions and choices as JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                help="file to write, '-' for stdout")
+        parser.add_argument('--topic', help="only export surveys of this topic")
+        parser.add_argument('--accepted', action='store_true',
+                help="only export accepted surveys")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        qs = (Survey.objects.select_related('user').order_by('id')
+                .prefetch_related(Prefetch(
+                    'question_set',
+                    queryset=Question.objects.order_by('id').prefetch_related(
+                        Prefetch('choice_set', queryset=Choice.objects.order_by('id'))))))
+        if options['topic']:
+            qs = qs.filter(topic=options['topic'])
+        if options['accepted']:
+            qs = qs.filter(status=Survey.StateSurvey.ACCEPTED)
+
+        chunk_size = options['chunk_size']
+        output = (None if options['output'] == '-'
+                else open(options['output'], 'w', encoding='utf-8'))
+        start = time.perf_counter()
+        n = 0
+
+        try:
+            for survey in qs.iterator(chunk_size=chunk_size):
+                line = json.dumps(survey_to_json(survey), ensure_ascii=False)
+                if output is None:
+                    self.stdout.write(line)
+                else:
+                    output.write(line + '\n')
+                n += 1
+                if n % chunk_size == 0:
+                    self.progress(n, start)
+        finally:
+            if output is not None:
+                output.close()
+
+        self.progress(n, start, final=True)
+
+    def progress(self, n: int, start: float, final: bool = False):
+        elapsed = time.perf_counter() - start
+        rate = n / elapsed if elapsed else 0
+        message = f"exported {n} surveys in {elapsed:.2f}s ({rate:.0f} surveys/s)"
+        self.stderr.write(self.style.SUCCESS(message) if final else message)
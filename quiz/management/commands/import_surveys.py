@@ -0,0 +1,70 @@
+import json
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.creation import create_surveys, survey_data_from_json, validate_survey_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Import surveys from JSON lines as written by export_surveys, one "
+        "survey per line. Lines are validated and inserted in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-',
+                help="file to read, '-' for stdin")
+        parser.add_argument('--user', required=True,
+                help="username that will own the imported surveys")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"user {options['user']!r} does not exist")
+
+        source = (sys.stdin if options['input'] == '-'
+                else open(options['input'], encoding='utf-8'))
+        start = time.perf_counter()
+        batch, imported, skipped = [], 0, 0
+
+        try:
+            for n_line, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    data_form = survey_data_from_json(json.loads(line), user)
+                    validate_survey_data(data_form)
+                except (ValueError, ValidationError) as error:
+                    skipped += 1
+                    messages = getattr(error, 'messages', [str(error)])
+                    self.stderr.write(f"line {n_line} skipped: {'; '.join(messages)}")
+                    continue
+
+                batch.append(data_form)
+                if len(batch) >= options['batch_size']:
+                    imported += len(create_surveys(batch))
+                    batch = []
+                    self.progress(imported, start)
+
+            if batch:
+                imported += len(create_surveys(batch))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"imported {imported} surveys, skipped {skipped}, in {elapsed:.2f}s "
+            f"({rate:.0f} surveys/s)"))
+
+    def progress(self, imported: int, start: float):
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stderr.write(f"imported {imported} surveys ({rate:.0f} surveys/s)")
@@ -0,0 +1,242 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import (
+        HTTPCookieProcessor,
+        HTTPRedirectHandler,
+        Request,
+        build_opener,
+        )
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from quiz.benchmarks import percentile
+from quiz.models import Survey
+
+QUESTION_URL = re.compile(r'action="(\d+/questions/\d+)"')
+CHOICE_VALUE = re.compile(r'name="choice"[^>]*value="(\d+)"')
+# redirect targets of the successful steps, a failed login goes to
+# /?failed-login=1, a failed start to /?failed=1 and a lost game to /
+LOGGED_IN = re.compile(r'^/$')
+STARTED = re.compile(r'^/quiz/\d+$')
+NEXT_STEP = re.compile(r'^/quiz/\d+/(questions/\d+|results)$')
+
+
+class NoRedirect(HTTPRedirectHandler):
+    """ Every hop of the quiz is timed on its own, redirects are not followed. """
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    """
+    Latencies of the successful requests and the errors per endpoint, by
+    reason, shared by the virtual users.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, Counter] = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint: str, seconds: float, error: str | None = None) -> None:
+        with self.lock:
+            if error is None:
+                self.latencies[endpoint].append(seconds)
+            else:
+                self.errors[endpoint][error] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted({*self.latencies, *self.errors}):
+            values = sorted(self.latencies[endpoint])
+            errors = sum(self.errors[endpoint].values())
+            requests = len(values) + errors
+            endpoints[endpoint] = {
+                'requests': requests,
+                'errors': errors,
+                'error_rate': errors / requests,
+                'error_reasons': dict(self.errors[endpoint]),
+                'throughput': requests / elapsed if elapsed else 0.0,
+                'mean_ms': 1000 * sum(values) / len(values) if values else 0.0,
+                'p50_ms': 1000 * percentile(values, 50),
+                'p95_ms': 1000 * percentile(values, 95),
+                'p99_ms': 1000 * percentile(values, 99),
+            }
+
+        total = sum(e['requests'] for e in endpoints.values())
+        errors = sum(e['errors'] for e in endpoints.values())
+        return {
+            'elapsed_s': elapsed,
+            'requests': total,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'throughput': total / elapsed if elapsed else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+class Player:
+    """ A virtual user with its own cookies, playing whole quizzes. """
+
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float) -> None:
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def csrf_token(self) -> str:
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def request(self, endpoint: str, path: str, data: dict | None = None,
+            expected: tuple[int, ...] = (200,),
+            target: re.Pattern | None = None) -> tuple[int, str, str]:
+        """
+        Return status, body and Location header, timing the request. It
+        fails unless the status is expected and, for a redirect, the Location
+        matches the target, a failed request returns no Location.
+        """
+        url = urljoin(self.base_url, path)
+        body = None
+        headers = {'Referer': self.base_url}
+        if data is not None:
+            body = urlencode({**data, 'csrfmiddlewaretoken': self.csrf_token()}).encode()
+
+        start = time.perf_counter()
+        try:
+            request = Request(url, data=body, headers=headers)
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, text, location = response.status, response.read().decode(), ''
+        except HTTPError as error:
+            status, text = error.code, error.read().decode(errors='replace')
+            location = error.headers.get('Location', '')
+        except (URLError, OSError):
+            status, text, location = 0, '', ''
+
+        seconds = time.perf_counter() - start
+        error = None
+        if status == 0:
+            error = 'connection error'
+        elif status not in expected:
+            error = f'HTTP {status}'
+        elif target is not None and not target.search(location):
+            error = f'redirect to {location}'
+        self.recorder.add(endpoint, seconds, error)
+        return status, text, location if error is None else ''
+
+    def login(self, username: str, password: str) -> bool:
+        self.request('index', '/')
+        _, _, location = self.request(
+                'login', '/accounts/login/',
+                {'username': username, 'password': password},
+                expected=(302,), target=LOGGED_IN)
+        return bool(location)
+
+    def play(self, topic: str) -> None:
+        _, _, location = self.request(
+                'start', '/quiz/start', {'topic': topic},
+                expected=(302,), target=STARTED)
+        if not location:
+            return
+
+        status, text, _ = self.request('survey', location)
+        match = QUESTION_URL.search(text)
+        if match is None:
+            return
+        path = urljoin(location, match.group(1))
+
+        while '/questions/' in path:
+            status, text, _ = self.request('question_get', path)
+            choices = CHOICE_VALUE.findall(text)
+            _, _, path = self.request(
+                    'question_post', path,
+                    {'choice': random.choice(choices) if choices else 0,
+                     'timerVal': random.randint(0, 15)},
+                    expected=(302,), target=NEXT_STEP)
+            if not path:
+                return
+
+        self.request('results', path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive full quiz games (login, start, every question, results) "
+        "against a running server with concurrent virtual users, and report "
+        "throughput, latency percentiles and error rates per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/')
+        parser.add_argument('--users', type=int, default=10,
+                help="concurrent virtual users")
+        parser.add_argument('--games', type=int, default=5,
+                help="games played by each user")
+        parser.add_argument('--topic', action='append',
+                help="topic to play, repeat for several (default: all but TST)")
+        parser.add_argument('--username', default='loadtest-{}',
+                help="username pattern, {} is the number of the user")
+        parser.add_argument('--password', default='loadtest-pass')
+        parser.add_argument('--create-users', action='store_true',
+                help="create the users first, the server must share this database")
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--output', help="write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        topics = options['topic'] or [
+            t for t in Survey.SurveyTopics.values if t != Survey.SurveyTopics.TEST]
+        usernames = [options['username'].format(i) for i in range(options['users'])]
+        if options['create_users']:
+            self.create_users(usernames, options['password'])
+
+        recorder = Recorder()
+
+        def run(username: str) -> None:
+            player = Player(options['url'], recorder, options['timeout'])
+            if not player.login(username, options['password']):
+                return
+            for _ in range(options['games']):
+                player.play(random.choice(topics))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['users']) as pool:
+            list(pool.map(run, usernames))
+        report = recorder.report(time.perf_counter() - start)
+        report['config'] = {
+            k: options[k] for k in ('url', 'users', 'games', 'timeout')}
+        report['config']['topics'] = topics
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+
+    def create_users(self, usernames: list[str], password: str) -> None:
+        existing = set(User.objects.filter(username__in=usernames)
+                .values_list('username', flat=True))
+        for username in usernames:
+            if username not in existing:
+                User.objects.create_user(username=username, password=password)
+
+    def print_report(self, report: dict) -> None:
+        self.stdout.write(
+            f"{report['requests']} requests in {report['elapsed_s']:.2f}s, "
+            f"{report['throughput']:.1f} req/s, error rate {report['error_rate']:.2%}")
+        self.stdout.write(
+            f"{'endpoint':<15}{'reqs':>7}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for name, e in report['endpoints'].items():
+            self.stdout.write(
+                f"{name:<15}{e['requests']:>7}{e['error_rate']:>8.2%}"
+                f"{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['p99_ms']:>9.1f}")
+        for name, e in report['endpoints'].items():
+            for reason, n in e['error_reasons'].items():
+                self.stdout.write(f"error {name}: {reason} x {n}")
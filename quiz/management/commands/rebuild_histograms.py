@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz.models import QuestionStats, ScoreBucket
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per survey and per topic score histograms from the "
+        "answers, and the question statistics from the responses."
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        n = ScoreBucket.rebuild()
+        n_questions = QuestionStats.rebuild()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {n} score buckets and the statistics of {n_questions} "
+            f"questions in {elapsed:.2f}s"))
@@ -0,0 +1,35 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in small batches, so the django_session "
+        "table stays small without a long lock. Meant to run periodically, "
+        "e.g. from the scheduler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-batches', type=int, default=100,
+                help="stop after this many batches, the next run continues")
+        parser.add_argument('--pause', type=float, default=0.0,
+                help="seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now).order_by('expire_date')
+        deleted = 0
+
+        for _ in range(options['max_batches']):
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f"deleted {deleted} expired sessions"))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_remove_answer_choice_remove_answer_interval_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['topic', 'status', 'id'], name='survey_topic_status_idx'),
+        ),
+    ]
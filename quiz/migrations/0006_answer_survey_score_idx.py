@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_survey_topic_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['survey', '-score'], name='answer_survey_score_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_answer_survey_score_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(choices=[('TST', 'Test Survey'), ('HUM', 'Humedales'), ('PAR', 'Páramo'), ('CLO', 'Bosque de niebla'), ('RAI', 'Bosque Humedo'), ('DRY', 'Bosque Seco'), ('ISL', 'Ecosistemas Insulares'), ('MGV', 'Manglares'), ('COR', 'Arrecifes de Coral')], max_length=15)),
+                ('score', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('survey', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='quiz.survey')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='scorebucket',
+            constraint=models.UniqueConstraint(condition=models.Q(('survey__isnull', False)), fields=('survey', 'score'), name='scorebucket_survey_score_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='scorebucket',
+            constraint=models.UniqueConstraint(condition=models.Q(('survey__isnull', True)), fields=('topic', 'score'), name='scorebucket_topic_score_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0007_scorebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyCreationKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz.survey')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='surveycreationkey',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='surveycreationkey_user_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_surveycreationkey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['-creation_date', '-id'], name='survey_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['user', '-creation_date', '-id'], name='survey_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['topic', '-creation_date', '-id'], name='survey_topic_created_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_question_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceAnalysis',
+            fields=[
+                ('choice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analysis', serialize=False, to='quiz.choice')),
+                ('pick_rate', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionAnalysis',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analysis', serialize=False, to='quiz.question')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('difficulty', models.FloatField(default=0)),
+                ('discrimination', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,9 +1,25 @@
+from collections import Counter
 from typing import Any
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models import QuerySet, Sum
-from django.views.generic.base import logging
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Case, Count, F, QuerySet, Sum, When
+
+from .leaderboards import LeaderboardEntry, atop_n, record_score, top_n
+from .plans import (
+        QUESTION_TIME,
+        PlanQuestion,
+        SurveyPlan,
+        asurvey_version,
+        bump_survey_versions,
+        plan_cache,
+        survey_version,
+        )
+from .pools import discard_topic_pool
+from .writebehind import PendingAnswer, answer_buffer
 
 
 class Survey(models.Model):
@@ -37,6 +53,27 @@ class Survey(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=60,default="Quiz with no name")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['topic', 'status', 'id'],
+                name='survey_topic_status_idx'),
+            # keyset pages of the survey list, see quiz/pagination.py
+            models.Index(fields=['-creation_date', '-id'],
+                name='survey_created_idx'),
+            models.Index(fields=['user', '-creation_date', '-id'],
+                name='survey_user_created_idx'),
+            models.Index(fields=['topic', '-creation_date', '-id'],
+                name='survey_topic_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Remember the topic read, the signals also drop the pools of the old topic. """
+        instance = super().from_db(db, field_names, values)
+        if 'topic' in field_names:
+            instance.loaded_topic = instance.topic
+        return instance
+
     @property
     def n_questions(self):
         """ derived attribute of the Survey Model """
@@ -46,19 +83,88 @@ class Survey(models.Model):
     def questions(self) -> list['Question']:
         return [q for q in self.question_set.all().order_by('id')]
 
-    def next_question(self, q_id: int | None = None) -> 'Question | None':
-        questions = self.questions
-        if q_id is None:
-            return questions[0]
+    @property
+    def question_tree(self):
+        """
+        Lazy queryset of the questions with their choices prefetched, read
+        from the primary as it fills the fragment cache.
+        """
+        return self.question_set.using(DEFAULT_DB_ALIAS).order_by('id').prefetch_related('choice_set')
+
+    @property
+    def version(self) -> int:
+        """ Stamp that changes on any write to the survey or its content. """
+        return survey_version(self.pk)
+
+    @property
+    def plan(self) -> SurveyPlan | None:
+        return Survey.get_plan(self.pk)
+
+    @staticmethod
+    def get_plan(survey_id: int) -> SurveyPlan | None:
+        """
+        Return the cached SurveyPlan of the survey, building it if it is
+        missing or stale with a single query over survey, questions and
+        choices. None if the survey doesn't exist.
+        """
+        version = survey_version(survey_id)
+        plan = plan_cache.get(survey_id, version)
+        if plan is not None:
+            return plan
+
+        plan = SurveyPlan.from_rows(list(Survey.plan_rows(survey_id)), version)
+        if plan is not None:
+            plan_cache.put(plan)
+        return plan
 
-        q_indexes = [q.id for q in questions]
-        idx = q_indexes.index(q_id)
+    @staticmethod
+    async def aget_plan(survey_id: int) -> SurveyPlan | None:
+        """ Async version of get_plan. """
+        version = await asurvey_version(survey_id)
+        plan = plan_cache.get(survey_id, version)
+        if plan is not None:
+            return plan
+
+        rows = [row async for row in Survey.plan_rows(survey_id)]
+        plan = SurveyPlan.from_rows(rows, version)
+        if plan is not None:
+            plan_cache.put(plan)
+        return plan
+
+    @staticmethod
+    def plan_rows(survey_id: int) -> QuerySet:
+        """ Survey LEFT JOIN question LEFT JOIN choice, see SurveyPlan.from_rows """
+        return (Survey.objects.using(DEFAULT_DB_ALIAS).filter(pk=survey_id)
+                .order_by('question__id', 'question__choice__id')
+                .values_list(
+                    'id', 'name', 'topic', 'status',
+                    'question__id', 'question__question_text',
+                    'question__choice__id', 'question__choice__choice_text',
+                    'question__choice__is_correct'))
 
-        if idx+1 >= len(q_indexes):
-            return None
+    def next_question(self, q_id: int | None = None) -> PlanQuestion | None:
+        plan = self.plan
+        next_id = plan.next_question_id(q_id)
+        return None if next_id is None else plan.question(next_id)
+
+    @staticmethod
+    def set_status(queryset: QuerySet, status: int) -> int:
+        """
+        Change the status of many surveys with a single UPDATE. Updates send
+        no signals, so the plans and topic pools of the surveys are
+        invalidated here once the change is committed.
+        """
+        with transaction.atomic():
+            rows = list(queryset.order_by().values_list('id', 'topic'))
+            updated = queryset.update(status=status)
 
-        return questions[idx+1]
+            def invalidate():
+                bump_survey_versions(pk for pk, _ in rows)
+                for topic in {topic for _, topic in rows}:
+                    discard_topic_pool(topic)
 
+            transaction.on_commit(invalidate)
+        return updated
     
     @staticmethod
     def from_form(data_form) -> dict[str,Any]:
@@ -91,10 +197,7 @@ class Question(models.Model):
         return self.choice_set.filter(is_correct=True).first()
 
     def score(self, choice_pk: int, timer: int):
-        correct_answer = self.correct_answer
-        if correct_answer is None or correct_answer.pk == choice_pk:
-            return timer
-        return 0
+        return Survey.get_plan(self.survey_id).score(self.pk, choice_pk, timer)
 
     def __str__(self):
        return f"{self.question_text}"
@@ -106,13 +209,13 @@ class Question(models.Model):
         the questions with this object and update the dict.
         """
         survey = data_form['survey']
+        entries = [val for key, val in data_form.items() if 'question' in key]
 
-        for key, val in data_form.items():
-            if 'question' not in key:
-                continue
-            text = val.pop('question_text')
-            question = Question(question_text = text, survey = survey)
-            question.save()
+        questions = Question.objects.bulk_create([
+            Question(question_text = val.pop('question_text'), survey = survey)
+            for val in entries])
+
+        for val, question in zip(entries, questions):
             val.update({'question': question})
 
         return data_form
@@ -134,6 +237,8 @@ class Choice(models.Model):
         Takes a dict with the data of the form and Questions objects. Create
         the Choices objects of this Questions and return the updated dict.
         """
+        pending: list[tuple[dict, str, Choice]] = []
+
         for key, val in data_form.items():
             if 'question' not in key:
                 continue
@@ -143,13 +248,35 @@ class Choice(models.Model):
                     continue
                 choice = Choice(
                         choice_text = val2.get('choice_text'),
-                        is_correct = val2.get('is_correct'),
+                        explanation = val2.get('explanation', ''),
+                        is_correct = val2.get('is_correct', False),
                         question = question)
-                choice.save()
-                val.update({key2:choice})
+                pending.append((val, key2, choice))
+
+        Choice.objects.bulk_create([choice for _, _, choice in pending])
+        for val, key2, choice in pending:
+            val.update({key2:choice})
 
         return data_form
 
+class SurveyCreationKey(models.Model):
+    """
+    Idempotency key sent by an authoring tool with a new survey. A retry
+    with the same key returns the survey created the first time.
+    """
+    objects = models.Manager()
+
+    key = models.CharField(max_length=64)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE)
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'],
+                name='surveycreationkey_user_key_uniq'),
+        ]
+
 class Answer(models.Model):
     objects = models.Manager()
 
@@ -158,9 +285,353 @@ class Answer(models.Model):
     creation_date = models.DateTimeField(auto_now_add=True)
     score = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['survey', '-score'],
+                name='answer_survey_score_idx'),
+        ]
+
+    @staticmethod
+    def top_n_answers(n: int, survey_id: int) -> list[LeaderboardEntry]:
+        return top_n(survey_id, n)
+
+    @staticmethod
+    async def atop_n_answers(n: int, survey_id: int) -> list[LeaderboardEntry]:
+        return await atop_n(survey_id, n)
+
+    @property
+    def is_pending(self) -> bool:
+        """ Queued in the write-behind buffer, not stored yet. """
+        return self.pk is None
+
+    @staticmethod
+    def record(user: User, survey_id: int, score: int,
+            picks: dict[int, tuple[int, int]] | None = None) -> 'Answer':
+        """
+        Store the score of a finished quiz, the per question responses in
+        picks, see QuestionResponse.from_picks, and update the leaderboard
+        and statistics. The answer is queued instead when QUIZ_WRITE_BEHIND
+        is on, see quiz/writebehind.py.
+        """
+        plan = Survey.get_plan(survey_id)
+        answer = Answer(user=user, survey_id=survey_id, score=score)
+        responses = QuestionResponse.from_picks(plan, picks or {})
+        if settings.QUIZ_WRITE_BEHIND:
+            answer_buffer.start()
+            pending = PendingAnswer(answer, user.username, plan.topic, responses)
+            if answer_buffer.offer(pending):
+                return answer
+
+        Answer.save_with_responses(answer, responses)
+        record_score(survey_id, answer.pk, score, user.username)
+        ScoreBucket.add_score(survey_id, plan.topic, score)
+        return answer
+
+    @staticmethod
+    async def arecord(user: User, survey_id: int, score: int,
+            picks: dict[int, tuple[int, int]] | None = None) -> 'Answer':
+        """ Async version of record, it never waits for room in the buffer. """
+        plan = await Survey.aget_plan(survey_id)
+        answer = Answer(user=user, survey_id=survey_id, score=score)
+        responses = QuestionResponse.from_picks(plan, picks or {})
+        if settings.QUIZ_WRITE_BEHIND:
+            answer_buffer.start()
+            pending = PendingAnswer(answer, user.username, plan.topic, responses)
+            if answer_buffer.offer(pending, block=False):
+                return answer
+
+        await sync_to_async(Answer.save_with_responses)(answer, responses)
+        await sync_to_async(record_score)(survey_id, answer.pk, score, user.username)
+        await sync_to_async(ScoreBucket.add_score)(survey_id, plan.topic, score)
+        return answer
+
+    @staticmethod
+    @transaction.atomic
+    def save_with_responses(answer: 'Answer', responses: list['QuestionResponse']) -> None:
+        answer.save()
+        Answer.save_responses(answer, responses)
+
     @staticmethod
-    def top_n_answers(n: int, survey: Survey):
-        return Answer.objects.filter(survey=survey).order_by('-score')[:n]
+    def save_responses(answer: 'Answer', responses: list['QuestionResponse']) -> None:
+        """ One INSERT for the responses of a saved answer, then the statistics. """
+        for response in responses:
+            response.answer = answer
+        QuestionResponse.objects.bulk_create(responses)
+        QuestionStats.add_responses(responses)
+
 
+class ScoreBucket(models.Model):
+    """
+    Histogram of the answers scores. Rows with a survey count the answers of
+    that survey, rows without survey count the answers of the whole topic.
+    Scores are bounded by the timers, so there are few buckets per survey.
+    Deleting a survey or a user rebuilds them, answers deleted on their own
+    stay counted until the next rebuild_histograms.
+    """
+    objects = models.Manager()
+
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, blank=True, null=True)
+    topic = models.CharField(max_length=15, choices=Survey.SurveyTopics.choices)
+    score = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['survey', 'score'],
+                condition=models.Q(survey__isnull=False),
+                name='scorebucket_survey_score_uniq'),
+            models.UniqueConstraint(fields=['topic', 'score'],
+                condition=models.Q(survey__isnull=True),
+                name='scorebucket_topic_score_uniq'),
+        ]
+
+    @staticmethod
+    def add_score(survey_id: int, topic: str, score: int, n: int = 1) -> None:
+        """ Add n answers with the given score to the survey and topic buckets. """
+        for lookup in ({'survey_id': survey_id}, {'survey_id': None, 'topic': topic}):
+            buckets = ScoreBucket.objects.filter(score=score, **lookup)
+            if buckets.update(count=F('count') + n):
+                continue
+            try:
+                with transaction.atomic():
+                    ScoreBucket.objects.create(
+                            score=score, count=n, **{'topic': topic, **lookup})
+            except IntegrityError:
+                buckets.update(count=F('count') + n)
 
+    @staticmethod
+    def standing(score: int, survey_id: int | None = None,
+            topic: str | None = None, pending: bool = False) -> dict[str, int]:
+        """
+        Rank of the score and percentage of players it beats, within a survey
+        or, if no survey is given, within a topic. Reads one row per bucket.
+        A pending score is still in the write-behind buffer, it is counted as
+        one more player.
+        """
+        counts = ScoreBucket.standing_queryset(survey_id, topic).aggregate(
+                **ScoreBucket.standing_sums(score))
+        return ScoreBucket.standing_from_counts(counts, pending)
+
+    @staticmethod
+    async def astanding(score: int, survey_id: int | None = None,
+            topic: str | None = None, pending: bool = False) -> dict[str, int]:
+        """ Async version of standing. """
+        counts = await ScoreBucket.standing_queryset(survey_id, topic).aaggregate(
+                **ScoreBucket.standing_sums(score))
+        return ScoreBucket.standing_from_counts(counts, pending)
+
+    @staticmethod
+    def standing_queryset(survey_id: int | None, topic: str | None) -> QuerySet:
+        lookup = ({'survey_id': survey_id} if survey_id is not None
+                else {'survey_id': None, 'topic': topic})
+        return ScoreBucket.objects.filter(**lookup)
+
+    @staticmethod
+    def standing_sums(score: int) -> dict[str, Sum]:
+        return {
+            'total': Sum('count'),
+            'below': Sum('count', filter=models.Q(score__lt=score)),
+            'above': Sum('count', filter=models.Q(score__gt=score)),
+        }
+
+    @staticmethod
+    def standing_from_counts(counts: dict[str, int | None],
+            pending: bool = False) -> dict[str, int]:
+        total = (counts['total'] or 0) + pending
+        below = counts['below'] or 0
+        return {
+            'rank': (counts['above'] or 0) + 1,
+            'players': total,
+            'percentile': round(100 * below / total) if total else None,
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(survey_ids=None, topics=None) -> int:
+        """
+        Recompute the histograms from the Answer table with group by queries,
+        every one of them or only those of the given surveys and topics.
+        """
+        survey_rows = ScoreBucket.objects.filter(survey__isnull=False)
+        topic_rows = ScoreBucket.objects.filter(survey__isnull=True)
+        per_survey = per_topic = Answer.objects.filter(survey__isnull=False)
+        if survey_ids is not None:
+            survey_rows = survey_rows.filter(survey_id__in=survey_ids)
+            per_survey = per_survey.filter(survey_id__in=survey_ids)
+        if topics is not None:
+            topic_rows = topic_rows.filter(topic__in=topics)
+            per_topic = per_topic.filter(survey__topic__in=topics)
+        survey_rows.delete()
+        topic_rows.delete()
+
+        per_survey = (per_survey
+                .values_list('survey_id', 'survey__topic', 'score')
+                .annotate(n=Count('id')).order_by())
+        per_topic = (per_topic
+                .values_list('survey__topic', 'score')
+                .annotate(n=Count('id')).order_by())
+
+        buckets = [
+            ScoreBucket(survey_id=s_id, topic=topic, score=score, count=n)
+            for s_id, topic, score, n in per_survey.iterator()]
+        buckets += [
+            ScoreBucket(topic=topic, score=score, count=n)
+            for topic, score, n in per_topic.iterator()]
+
+        ScoreBucket.objects.bulk_create(buckets, batch_size=1000)
+        return len(buckets)
+
+    def __str__(self):
+        return f"{self.survey_id or self.topic}: {self.score} x {self.count}"
+
+
+class QuestionResponse(models.Model):
+    """ One question of a recorded attempt: the pick and the time left. """
+    objects = models.Manager()
+
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.SET_NULL, blank=True, null=True)
+    time_left = models.PositiveSmallIntegerField(default=0)
+    is_correct = models.BooleanField(default=False)
+
+    @staticmethod
+    def from_picks(plan: SurveyPlan,
+            picks: dict[int, tuple[int, int]]) -> list['QuestionResponse']:
+        """
+        Unsaved responses of an attempt, picks maps a question id to the
+        (choice id, timer) of the player. A choice that is not one of the
+        question is stored as no choice.
+        """
+        responses = []
+        for q_id, (choice_id, timer) in picks.items():
+            if q_id not in plan:
+                continue
+            choices = {c.id for c in plan.question(q_id).choices}
+            choice_id = choice_id if choice_id in choices else None
+            key = plan.answer_key.get(q_id)
+            responses.append(QuestionResponse(
+                    question_id=q_id,
+                    choice_id=choice_id,
+                    time_left=min(max(timer, 0), QUESTION_TIME),
+                    is_correct=choice_id is not None and key in (None, choice_id)))
+        return responses
+
+
+class QuestionStats(models.Model):
+    """
+    Running totals of the responses to a question, updated as attempts are
+    recorded so the statistics page never scans QuestionResponse.
+    """
+    objects = models.Manager()
+
+    question = models.OneToOneField(
+            Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    time_left_sum = models.PositiveIntegerField(default=0)
+
+    @property
+    def percent_correct(self) -> int | None:
+        return round(100 * self.correct / self.attempts) if self.attempts else None
+
+    @property
+    def mean_time_left(self) -> float | None:
+        return self.time_left_sum / self.attempts if self.attempts else None
+
+    @staticmethod
+    def add_responses(responses: list[QuestionResponse]) -> None:
+        """
+        Add the responses, of one or many attempts, to the totals of their
+        questions and choices: one UPDATE per table whatever their number.
+        """
+        if not responses:
+            return
+        totals: dict[int, list[int]] = {}
+        picks: Counter[int] = Counter()
+        for r in responses:
+            total = totals.setdefault(r.question_id, [0, 0, 0])
+            total[0] += 1
+            total[1] += r.is_correct
+            total[2] += r.time_left
+            if r.choice_id is not None:
+                picks[r.choice_id] += 1
+
+        QuestionStats.objects.bulk_create(
+                [QuestionStats(question_id=q_id) for q_id in totals],
+                ignore_conflicts=True)
+        QuestionStats.objects.filter(question_id__in=totals).update(**{
+            field: F(field) + Case(
+                *[When(question_id=q_id, then=total[i]) for q_id, total in totals.items()],
+                default=0)
+            for i, field in enumerate(('attempts', 'correct', 'time_left_sum'))})
+
+        if picks:
+            ChoiceStats.objects.bulk_create(
+                    [ChoiceStats(choice_id=c_id) for c_id in picks],
+                    ignore_conflicts=True)
+            ChoiceStats.objects.filter(choice_id__in=picks).update(picks=F('picks') + Case(
+                    *[When(choice_id=c_id, then=n) for c_id, n in picks.items()],
+                    default=0))
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild() -> int:
+        """ Recompute the question and choice totals from the responses. """
+        QuestionStats.objects.all().delete()
+        ChoiceStats.objects.all().delete()
+
+        per_question = (QuestionResponse.objects.values_list('question_id')
+                .annotate(attempts=Count('id'),
+                    correct=Count('id', filter=models.Q(is_correct=True)),
+                    time_left_sum=Sum('time_left'))
+                .order_by())
+        per_choice = (QuestionResponse.objects.filter(choice__isnull=False)
+                .values_list('choice_id').annotate(picks=Count('id')).order_by())
+
+        QuestionStats.objects.bulk_create([
+            QuestionStats(question_id=q_id, attempts=attempts, correct=correct,
+                time_left_sum=time_left_sum)
+            for q_id, attempts, correct, time_left_sum in per_question.iterator()],
+            batch_size=1000)
+        ChoiceStats.objects.bulk_create([
+            ChoiceStats(choice_id=c_id, picks=picks)
+            for c_id, picks in per_choice.iterator()],
+            batch_size=1000)
+        return QuestionStats.objects.count()
+
+
+class ChoiceStats(models.Model):
+    """ Running count of the players that picked a choice. """
+    objects = models.Manager()
+
+    choice = models.OneToOneField(
+            Choice, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    picks = models.PositiveIntegerField(default=0)
+
+
+class QuestionAnalysis(models.Model):
+    """
+    Classical test theory metrics of a question over every recorded attempt,
+    written by the analyze_items command, see quiz/analytics.py.
+    """
+    objects = models.Manager()
+
+    question = models.OneToOneField(
+            Question, on_delete=models.CASCADE, primary_key=True, related_name='analysis')
+    attempts = models.PositiveIntegerField(default=0)
+    # share of the attempts that got the question right
+    difficulty = models.FloatField(default=0)
+    # point biserial correlation with the rest of the attempt, None when
+    # every attempt got the same result
+    discrimination = models.FloatField(blank=True, null=True)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+
+class ChoiceAnalysis(models.Model):
+    """ Share of the attempts of its question that picked the choice. """
+    objects = models.Manager()
 
+    choice = models.OneToOneField(
+            Choice, on_delete=models.CASCADE, primary_key=True, related_name='analysis')
+    pick_rate = models.FloatField(default=0)
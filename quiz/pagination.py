@@ -0,0 +1,60 @@
+"""
+Keyset pagination of the survey list.
+
+A page is the next slice of surveys after the last (creation_date, id) seen,
+newest first, so a deep page costs the same index range scan as the first
+one instead of skipping OFFSET rows. The position travels in an opaque
+cursor in the query string.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Count, IntegerField, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Answer, Question, Survey
+
+PAGE_SIZE = 10
+
+
+def encode_cursor(survey: Survey) -> str:
+    raw = f"{survey.creation_date.isoformat()}|{survey.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    """ Position of the cursor, None for a missing or malformed one. """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        moment, pk = raw.split('|')
+        return datetime.fromisoformat(moment), int(pk)
+    except ValueError:
+        return None
+
+
+def count_of(model, field: str = 'survey') -> Coalesce:
+    """ Correlated COUNT of the rows of model pointing to the outer survey. """
+    rows = (model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field).annotate(n=Count('*')).values('n'))
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def annotate_counts(qs: QuerySet) -> QuerySet:
+    return qs.annotate(question_count=count_of(Question), play_count=count_of(Answer))
+
+
+def keyset_page(qs: QuerySet, cursor: str | None,
+        size: int = PAGE_SIZE) -> tuple[list[Survey], str | None]:
+    """ Surveys of the page after the cursor, and the cursor of the next page. """
+    position = decode_cursor(cursor)
+    if position is not None:
+        moment, pk = position
+        qs = qs.filter(Q(creation_date__lt=moment) | Q(creation_date=moment, pk__lt=pk))
+
+    page = list(qs.order_by('-creation_date', '-id')[:size + 1])
+    if len(page) <= size:
+        return page, None
+    page = page[:size]
+    return page, encode_cursor(page[-1])
@@ -0,0 +1,258 @@
+"""
+Compiled, read only representation of a survey used by the quiz flow.
+
+A SurveyPlan holds everything a game step needs (question order, choices and
+the answer key), so once it is built the quiz can be played without touching
+the database. Plans live in a process level LRU cache and are tagged with a
+version stamp stored in the django cache, any write to a Survey, Question or
+Choice bumps the stamp and the stale plan is rebuilt on the next lookup.
+The stamps only reach every worker through a shared cache, the settings
+refuse to start several workers without one.
+
+Every game plays the questions and the choices in its own order, drawn from
+a small seed kept in the game state, see seeded_order. The plan rebuilds the
+same order from the seed on every step instead of storing it.
+"""
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from types import MappingProxyType
+from typing import Mapping
+
+from django.core.cache import cache
+
+PLAN_CACHE_SIZE = 256
+QUESTION_TIME = 15
+VERSION_KEY = 'quiz:survey:{}:version'
+
+
+def seeded_order(n: int, seed: int | None, salt: int = 0) -> tuple[int, ...]:
+    """
+    Permutation of range(n) drawn from the seed, the same for the same
+    seed and salt. Without seed, as in games started before the seed was
+    kept, the order is the stored one.
+    """
+    order = list(range(n))
+    if seed is not None:
+        random.Random(f'{seed}:{salt}').shuffle(order)
+    return tuple(order)
+
+
+@dataclass(frozen=True, slots=True)
+class PlanChoice:
+    id: int
+    choice_text: str
+
+
+@dataclass(frozen=True, slots=True)
+class PlanQuestion:
+    id: int
+    question_text: str
+    choices: tuple[PlanChoice, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class SurveyPlan:
+    survey_id: int
+    name: str
+    topic: str
+    status: int
+    version: int
+    question_ids: tuple[int, ...]
+    positions: Mapping[int, int]
+    questions: Mapping[int, PlanQuestion]
+    answer_key: Mapping[int, int | None]
+
+    @staticmethod
+    def compile(
+            survey: tuple[int, str, str, int],
+            questions: list[tuple[int, str]],
+            choices: list[tuple[int, int, str, bool]],
+            version: int) -> 'SurveyPlan':
+        """
+        Build a plan from raw rows: the survey (id, name, topic, status), its
+        questions (id, text) and their choices (id, question_id, text,
+        is_correct). Rows must come ordered by id.
+        """
+        by_question: dict[int, list[PlanChoice]] = {q_id: [] for q_id, _ in questions}
+        answer_key: dict[int, int | None] = dict.fromkeys(by_question)
+
+        for ch_id, q_id, text, is_correct in choices:
+            by_question[q_id].append(PlanChoice(ch_id, text))
+            if is_correct and answer_key[q_id] is None:
+                answer_key[q_id] = ch_id
+
+        question_ids = tuple(q_id for q_id, _ in questions)
+        survey_id, name, topic, status = survey
+
+        return SurveyPlan(
+                survey_id=survey_id,
+                name=name,
+                topic=topic,
+                status=status,
+                version=version,
+                question_ids=question_ids,
+                positions=MappingProxyType(
+                    {q_id: i for i, q_id in enumerate(question_ids)}),
+                questions=MappingProxyType({
+                    q_id: PlanQuestion(q_id, text, tuple(by_question[q_id]))
+                    for q_id, text in questions}),
+                answer_key=MappingProxyType(answer_key))
+
+    @staticmethod
+    def from_rows(rows: list[tuple], version: int) -> 'SurveyPlan | None':
+        """
+        Build a plan from the flat rows of a survey LEFT JOIN question LEFT
+        JOIN choice query, ordered by question and choice id. Each row is
+        (survey id, name, topic, status, question id, question text, choice
+        id, choice text, is_correct). None if there are no rows.
+        """
+        if not rows:
+            return None
+
+        questions: dict[int, str] = {}
+        choices = []
+        for row in rows:
+            q_id, q_text, ch_id, ch_text, is_correct = row[4:]
+            if q_id is None:
+                continue
+            questions.setdefault(q_id, q_text)
+            if ch_id is not None:
+                choices.append((ch_id, q_id, ch_text, is_correct))
+
+        choices.sort()
+        return SurveyPlan.compile(
+                rows[0][:4], list(questions.items()), choices, version)
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def __contains__(self, q_id: int) -> bool:
+        return q_id in self.positions
+
+    def question(self, q_id: int) -> PlanQuestion | None:
+        return self.questions.get(q_id)
+
+    def next_question_id(self, q_id: int | None = None) -> int | None:
+        """
+        Id of the question that follows q_id, the first one if q_id is None,
+        and None at the end of the survey. Raise ValueError if q_id does not
+        belong to the survey.
+        """
+        if q_id is None:
+            idx = 0
+        elif q_id in self.positions:
+            idx = self.positions[q_id] + 1
+        else:
+            raise ValueError(f"question {q_id} not in survey {self.survey_id}")
+
+        return self.question_ids[idx] if idx < len(self.question_ids) else None
+
+    def question_order(self, seed: int | None) -> tuple[int, ...]:
+        """ Question ids in the order of a game. """
+        return tuple(self.question_ids[i] for i in seeded_order(len(self), seed))
+
+    def choice_order(self, q_id: int, seed: int | None) -> tuple[int, ...]:
+        """ Positions of the choices of a question in the order of a game. """
+        return seeded_order(len(self.questions[q_id].choices), seed, q_id)
+
+    def score(self, q_id: int, choice_pk: int, timer: int) -> int:
+        correct = self.answer_key.get(q_id)
+        if correct is None or correct == choice_pk:
+            return min(max(timer, 0), QUESTION_TIME)
+        return 0
+
+    def score_attempt(self, picks: Mapping[int, tuple[int, int]]) -> dict[int, int]:
+        """
+        Score a whole attempt in one pass, picks maps a question id to the
+        (choice id, timer) of the player. Unanswered questions score 0 and
+        a question from another survey raises ValueError.
+        """
+        foreign = picks.keys() - self.positions.keys()
+        if foreign:
+            raise ValueError(f"questions {sorted(foreign)} not in survey {self.survey_id}")
+
+        return {
+            q_id: self.score(q_id, *picks[q_id]) if q_id in picks else 0
+            for q_id in self.question_ids}
+
+    def playable(self) -> dict:
+        """ JSON ready description of the survey, without the answer key. """
+        return {
+            'id': self.survey_id,
+            'name': self.name,
+            'topic': self.topic,
+            'question_time': QUESTION_TIME,
+            'questions': [
+                {
+                    'id': q_id,
+                    'question_text': self.questions[q_id].question_text,
+                    'choices': [
+                        {'id': choice.id, 'choice_text': choice.choice_text}
+                        for choice in self.questions[q_id].choices],
+                } for q_id in self.question_ids],
+        }
+
+
+def survey_version(survey_id: int) -> int:
+    """ Current version stamp of the survey, created if missing. """
+    return cache.get_or_set(VERSION_KEY.format(survey_id), time.time_ns, None)
+
+
+async def asurvey_version(survey_id: int) -> int:
+    return await cache.aget_or_set(VERSION_KEY.format(survey_id), time.time_ns, None)
+
+
+def bump_survey_version(survey_id: int) -> None:
+    """ Mark every cached artifact of the survey as stale. """
+    cache.set(VERSION_KEY.format(survey_id), time.time_ns(), None)
+    plan_cache.discard(survey_id)
+
+
+def bump_survey_versions(survey_ids) -> None:
+    """ bump_survey_version for many surveys with a single cache write. """
+    stamp = time.time_ns()
+    survey_ids = list(survey_ids)
+    cache.set_many({VERSION_KEY.format(s_id): stamp for s_id in survey_ids}, None)
+    for s_id in survey_ids:
+        plan_cache.discard(s_id)
+
+
+class PlanCache:
+    """ Thread safe LRU of SurveyPlan objects keyed by survey id. """
+
+    def __init__(self, maxsize: int = PLAN_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._plans: OrderedDict[int, SurveyPlan] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, survey_id: int, version: int) -> SurveyPlan | None:
+        with self._lock:
+            plan = self._plans.get(survey_id)
+            if plan is None or plan.version != version:
+                return None
+            self._plans.move_to_end(survey_id)
+            return plan
+
+    def put(self, plan: SurveyPlan) -> None:
+        with self._lock:
+            self._plans[plan.survey_id] = plan
+            self._plans.move_to_end(plan.survey_id)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+
+    def discard(self, survey_id: int) -> None:
+        with self._lock:
+            self._plans.pop(survey_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+
+plan_cache = PlanCache()
@@ -0,0 +1,120 @@
+"""
+Per topic pools of accepted survey ids.
+
+StartView only needs one random accepted survey of a topic, so instead of
+reading the whole topic we keep the ids in the django cache and pick from
+them in constant time. When it is cold a random id range is chosen in SQL
+and the pool is warmed with an ids only query. The pool is shared by every
+worker, so it is never edited in place: the Survey signals drop it when a
+survey joins or leaves it, and it expires after POOL_TIMEOUT so a pool warmed
+from a read that raced a change heals by itself.
+
+The question bank games sample their questions from a second pool per topic,
+the (survey id, question id) pairs of the accepted surveys, so a game never
+reads the questions it does not play. Any change to the surveys of a topic or
+to a question drops that pool and the next game rebuilds it.
+"""
+import random
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Min
+
+POOL_KEY = 'quiz:topic:{}:accepted'
+QUESTION_POOL_KEY = 'quiz:topic:{}:questions'
+POOL_TIMEOUT = 60 * 60
+
+
+def topic_pool(topic: str) -> list[int] | None:
+    return cache.get(POOL_KEY.format(topic))
+
+
+def warm_topic_pool(topic: str) -> list[int]:
+    from .models import Survey
+
+    ids = list(Survey.objects.using(DEFAULT_DB_ALIAS)
+            .filter(topic=topic, status=Survey.StateSurvey.ACCEPTED)
+            .values_list('id', flat=True))
+    cache.set(POOL_KEY.format(topic), ids, POOL_TIMEOUT)
+    return ids
+
+
+def discard_topic_pool(topic: str) -> None:
+    cache.delete_many([POOL_KEY.format(topic), QUESTION_POOL_KEY.format(topic)])
+
+
+def update_pool(topic: str, survey_id: int, member: bool) -> None:
+    """
+    Drop a warm pool once the change commits if the survey joins or leaves
+    it, a cold pool is built on demand.
+    """
+    ids = topic_pool(topic)
+    if ids is not None and (survey_id in ids) != member:
+        transaction.on_commit(partial(discard_topic_pool, topic))
+
+
+def random_survey_id_sql(topic: str) -> int | None:
+    """
+    Pick a random accepted survey with two indexed queries: the id bounds of
+    the topic and the first id after a random pivot.
+    """
+    from .models import Survey
+
+    qs = Survey.objects.filter(topic=topic, status=Survey.StateSurvey.ACCEPTED)
+    bounds = qs.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return None
+
+    pivot = random.randint(bounds['low'], bounds['high'])
+    return (qs.filter(id__gte=pivot).order_by('id')
+            .values_list('id', flat=True).first())
+
+
+def random_survey_id(topic: str) -> int | None:
+    ids = topic_pool(topic)
+    if ids is not None:
+        return random.choice(ids) if ids else None
+
+    survey_id = random_survey_id_sql(topic)
+    warm_topic_pool(topic)
+    return survey_id
+
+
+async def arandom_survey_id(topic: str) -> int | None:
+    """ Async version of random_survey_id, a cold pool is warmed in a thread. """
+    ids = await cache.aget(POOL_KEY.format(topic))
+    if ids is not None:
+        return random.choice(ids) if ids else None
+    return await sync_to_async(random_survey_id)(topic)
+
+
+def question_pool(topic: str) -> list[tuple[int, int]] | None:
+    return cache.get(QUESTION_POOL_KEY.format(topic))
+
+
+def warm_question_pool(topic: str) -> list[tuple[int, int]]:
+    from .models import Question, Survey
+
+    pairs = list(Question.objects.using(DEFAULT_DB_ALIAS)
+            .filter(survey__topic=topic, survey__status=Survey.StateSurvey.ACCEPTED)
+            .order_by().values_list('survey_id', 'id'))
+    cache.set(QUESTION_POOL_KEY.format(topic), pairs, POOL_TIMEOUT)
+    return pairs
+
+
+def discard_question_pools(topics=None) -> None:
+    """ Drop the question pools of the topics, of every topic by default. """
+    from .models import Survey
+
+    topics = Survey.SurveyTopics.values if topics is None else topics
+    cache.delete_many([QUESTION_POOL_KEY.format(topic) for topic in topics])
+
+
+def sample_questions(topic: str, n: int) -> list[tuple[int, int]]:
+    """ Up to n distinct (survey id, question id) pairs of the topic. """
+    pairs = question_pool(topic)
+    if pairs is None:
+        pairs = warm_question_pool(topic)
+    return random.sample(pairs, min(n, len(pairs)))
@@ -0,0 +1,108 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .leaderboards import discard_leaderboards
+from .models import Answer, Choice, Question, ScoreBucket, Survey
+from .plans import bump_survey_version
+from .pools import discard_question_pools, update_pool
+
+
+def topic_of_question(question: Question) -> str | None:
+    """ Avoid the query when the survey is already cached in the question. """
+    if Question.survey.is_cached(question):
+        return question.survey.topic
+    return (Survey.objects.filter(pk=question.survey_id)
+            .values_list('topic', flat=True).first())
+
+
+def survey_id_of_choice(choice: Choice) -> int | None:
+    """ Avoid the query when the question is already cached in the choice. """
+    if Choice.question.is_cached(choice):
+        return choice.question.survey_id
+    return (Question.objects.filter(pk=choice.question_id)
+            .values_list('survey_id', flat=True).first())
+
+
+class HistogramRebuild:
+    """
+    Surveys, with their topic, whose answers a transaction deletes. Once it
+    commits their boards are discarded and only their histograms and those
+    of their topics are recomputed.
+    """
+    def __init__(self) -> None:
+        self.surveys: dict[int, str] = {}
+
+    def __call__(self) -> None:
+        discard_leaderboards(self.surveys)
+        ScoreBucket.rebuild(list(self.surveys), set(self.surveys.values()))
+
+
+def answers_deleted(surveys: dict[int, str]) -> None:
+    """
+    Deleting a survey or a user removes its answers in bulk, a receiver per
+    answer would load and update them one by one. A single rebuild is queued
+    per transaction, for every survey it deletes answers of.
+    """
+    connection = transaction.get_connection()
+    rebuild = next((func for _, func, *_ in connection.run_on_commit
+            if isinstance(func, HistogramRebuild)), None)
+    if rebuild is not None:
+        rebuild.surveys.update(surveys)
+        return
+    rebuild = HistogramRebuild()
+    rebuild.surveys.update(surveys)
+    transaction.on_commit(rebuild)
+
+
+@receiver([post_save, post_delete], sender=Survey)
+def survey_changed(sender, instance: Survey, **kwargs):
+    bump_survey_version(instance.pk)
+
+
+@receiver(post_save, sender=Survey)
+def survey_saved(sender, instance: Survey, **kwargs):
+    """ Keep the topic pools current, the topic itself could have changed. """
+    accepted = int(instance.status) == Survey.StateSurvey.ACCEPTED
+    for topic in Survey.SurveyTopics.values:
+        update_pool(topic, instance.pk, accepted and topic == instance.topic)
+
+    loaded = getattr(instance, 'loaded_topic', instance.topic)
+    discard_question_pools({instance.topic, loaded})
+    instance.loaded_topic = instance.topic
+
+
+@receiver(post_delete, sender=Survey)
+def survey_deleted(sender, instance: Survey, **kwargs):
+    update_pool(instance.topic, instance.pk, False)
+    discard_question_pools([instance.topic])
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance: Question, **kwargs):
+    bump_survey_version(instance.survey_id)
+    # the question pools hold ids, editing a question leaves them as they are
+    if kwargs.get('created', True):
+        if (topic := topic_of_question(instance)) is not None:
+            discard_question_pools([topic])
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance: Choice, **kwargs):
+    survey_id = survey_id_of_choice(instance)
+    if survey_id is not None:
+        bump_survey_version(survey_id)
+
+
+@receiver(pre_delete, sender=Survey)
+def survey_deleting(sender, instance: Survey, **kwargs):
+    answers_deleted({instance.pk: instance.topic})
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance: User, **kwargs):
+    surveys = dict(Answer.objects.filter(user=instance, survey__isnull=False)
+            .values_list('survey_id', 'survey__topic').distinct())
+    if surveys:
+        answers_deleted(surveys)
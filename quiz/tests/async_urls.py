@@ -0,0 +1,18 @@
+""" The quiz urls with the async views, as served with QUIZ_ASYNC_VIEWS. """
+from django.urls import path
+
+from qApp.urls import urlpatterns as project_urlpatterns
+from quiz.async_views import (
+        AsyncQuestionView,
+        AsyncResultsView,
+        AsyncStartView,
+        AsyncSurveyView,
+        )
+
+urlpatterns = [
+        path('quiz/start', AsyncStartView.as_view(), name='start'),
+        path('quiz/<int:id>', AsyncSurveyView.as_view(), name='survey'),
+        path('quiz/<int:s_id>/questions/<int:q_id>', AsyncQuestionView.as_view(), name='question'),
+        path('quiz/<int:id>/results', AsyncResultsView.as_view(), name='results'),
+        *project_urlpatterns,
+]
@@ -1,7 +1,9 @@
 from typing import Any
 
 from django.db.models.constraints import Enum
-from quiz.models import Answer, GameSession, Question, Choice, Survey
+from django.test import RequestFactory
+from quiz.games import GAME_COOKIE, game_token, load_game
+from quiz.models import Answer, Question, Choice, Survey
 from django.utils import timezone
 from django.contrib.auth.models import User
 
@@ -37,6 +39,25 @@ def create_mock_survey(topic: str | None = None):
     return survey
 
 
+def add_mock_questions(survey: Survey, n: int) -> None:
+    """ Append n questions, with a correct and a wrong choice, to the survey. """
+    start = survey.question_set.count()
+    questions = Question.objects.bulk_create(
+            Question(question_text=f"Question {i}", survey=survey)
+            for i in range(start, start + n))
+    Choice.objects.bulk_create(
+            Choice(choice_text=text, question=question, is_correct=correct)
+            for question in questions
+            for text, correct in (("Correct Answer", True), ("Incorrect Answer", False)))
+
+
+def game_order(client, survey: Survey) -> list[int]:
+    """ Question ids of the survey in the order of the game of the client. """
+    request = RequestFactory().get('/')
+    request.COOKIES[GAME_COOKIE] = client.cookies[GAME_COOKIE].value
+    return list(load_game(game_token(request)).question_order(Survey.get_plan(survey.id)))
+
+
 class MockFactory:
     @staticmethod
     def get_correct_choice(question: Question) -> Choice:
@@ -55,26 +76,8 @@ class MockFactory:
         return User.objects.create_superuser(username="super", password="pass")
 
     @staticmethod
-    def test_gamesession(user: User, survey: Survey) -> GameSession:
-        if not user:
-            user = MockFactory.test_user(1)
-
-        return GameSession.objects.create(
-                creation_date=timezone.now(),
-                user = user,
-                survey = survey)
-
-    @staticmethod
-    def test_answer(
-            session:GameSession,
-            question:Question,
-            choice: Choice,
-            time: int) -> Answer: 
-        return Answer.objects.create(session=session,
-                question=question,
-                choice= choice,
-                interval_time = time
-                )
+    def test_answer(user: User, survey: Survey, score: int) -> Answer:
+        return Answer.objects.create(user=user, survey=survey, score=score)
 
     @staticmethod
     def test_data(user: User, n_answers: int) -> dict[str, Any]:
@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from quiz.models import Survey
+from quiz.plans import plan_cache
+from quiz.pools import topic_pool, warm_topic_pool
+
+from .mocks import MockFactory, add_mock_questions, create_mock_survey
+
+
+class TestSurveyAdmin(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.surveys = [create_mock_survey() for _ in range(3)]
+        cls.superuser = MockFactory.test_superuser()
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+        self.client.force_login(self.superuser)
+
+    def changelist_queries(self) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/quiz/survey/', {'topic__exact': 'PAR'})
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow(self):
+        few = self.changelist_queries()
+        for _ in range(10):
+            create_mock_survey()
+        self.assertEqual(self.changelist_queries(), few)
+
+    def test_approve_runs_a_single_update(self):
+        Survey.objects.update(status=Survey.StateSurvey.REVIEW)
+        warm_topic_pool('PAR')
+        self.assertEqual(topic_pool('PAR'), [])
+
+        ids = [s.pk for s in self.surveys[:2]]
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/admin/quiz/survey/', {
+                    'action': 'approve', '_selected_action': ids})
+
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "quiz_survey"')]
+        self.assertEqual(len(updates), 1)
+        self.assertCountEqual(
+                Survey.objects.filter(status=Survey.StateSurvey.ACCEPTED)
+                .values_list('id', flat=True), ids)
+        # the pool was dropped and is rebuilt with the approved surveys
+        self.assertIsNone(topic_pool('PAR'))
+        self.assertCountEqual(warm_topic_pool('PAR'), ids)
+
+    def test_question_inline_is_capped(self):
+        survey = self.surveys[0]
+        add_mock_questions(survey, 100)
+        response = self.client.get(f'/admin/quiz/survey/{survey.pk}/change/')
+        self.assertContains(response, 'name="question_set-INITIAL_FORMS" value="50"')
+        self.assertContains(response, '105 questions')
+
+    def test_questions_of_a_survey_are_listed(self):
+        survey = self.surveys[0]
+        response = self.client.get(
+                '/admin/quiz/question/', {'survey__id__exact': survey.pk})
+        self.assertContains(response, 'Question 4')
+        self.assertEqual(len(response.context['cl'].result_list), 5)
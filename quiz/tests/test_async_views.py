@@ -0,0 +1,56 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from quiz.models import Answer
+from quiz.plans import plan_cache
+
+from .mocks import MockFactory, create_mock_survey, game_order
+
+
+@override_settings(ROOT_URLCONF='quiz.tests.async_urls')
+class TestAsyncQuizFlow(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.user = MockFactory.test_user(2)
+        cls.questions = cls.survey.questions
+        cls.correct = [MockFactory.get_correct_choice(q).id for q in cls.questions]
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+        self.async_client.force_login(self.user)
+
+    async def test_game_is_played_like_the_sync_views(self):
+        response = await self.async_client.post('/quiz/start', {'topic': 'PAR'})
+        self.assertRedirects(response, f'/quiz/{self.survey.id}', fetch_redirect_response=False)
+
+        order = await sync_to_async(game_order)(self.async_client, self.survey)
+        response = await self.async_client.get(f'/quiz/{self.survey.id}')
+        self.assertContains(response, f'{self.survey.id}/questions/{order[0]}')
+
+        questions = {q.id: (q, choice) for q, choice in zip(self.questions, self.correct)}
+        for q_id in order:
+            question, choice = questions[q_id]
+            url = f'/quiz/{self.survey.id}/questions/{q_id}'
+            response = await self.async_client.get(url)
+            self.assertContains(response, question.question_text)
+            response = await self.async_client.post(url, {'choice': choice, 'timerVal': 10})
+
+        self.assertRedirects(
+                response, f'/quiz/{self.survey.id}/results', fetch_redirect_response=False)
+
+        response = await self.async_client.get(f'/quiz/{self.survey.id}/results')
+        self.assertContains(response, '50')
+        self.assertContains(response, 'userTestCase2')
+        answer = await Answer.objects.aget(user=self.user)
+        self.assertEqual(answer.score, 50)
+
+    async def test_results_without_game_go_back_home(self):
+        response = await self.async_client.get(f'/quiz/{self.survey.id}/results')
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+
+    async def test_unknown_question_is_not_found(self):
+        response = await self.async_client.get(f'/quiz/{self.survey.id}/questions/0')
+        self.assertEqual(response.status_code, 404)
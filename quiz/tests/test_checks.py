@@ -0,0 +1,23 @@
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from quiz.checks import SHARED_CACHE, shared_cache_check
+
+
+class TestSharedCacheCheck(SimpleTestCase):
+    def test_one_worker_needs_no_shared_cache(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '1'}):
+            self.assertEqual(shared_cache_check(None), [])
+
+    def test_several_workers_without_redis_are_warned(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            warnings = shared_cache_check(None)
+        self.assertEqual([w.id for w in warnings], ['quiz.W001', 'quiz.W001'])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': SHARED_CACHE, 'LOCATION': 'redis://localhost:6379/0'}})
+    def test_redis_is_shared(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual(shared_cache_check(None), [])
@@ -0,0 +1,204 @@
+import json
+import statistics
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from quiz.models import (
+        Answer,
+        Choice,
+        ChoiceAnalysis,
+        Question,
+        QuestionAnalysis,
+        Survey,
+        )
+from quiz.plans import plan_cache
+
+from .mocks import MockFactory, create_mock_survey
+
+
+class TestSurveyExportImport(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.surveys = [create_mock_survey() for _ in range(3)]
+        cls.importer = MockFactory.test_user(2)
+
+    def export(self, *args) -> list[dict]:
+        out = StringIO()
+        call_command('export_surveys', *args, stdout=out, stderr=StringIO())
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_export_writes_one_survey_per_line(self):
+        # the surveys, then questions and choices once per chunk
+        with self.assertNumQueries(5):
+            rows = self.export('--chunk-size', '2')
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(rows[0]['questions']), 5)
+        self.assertEqual(rows[0]['questions'][0]['choices'][0],
+                {'choice_text': 'Correct Answer', 'is_correct': True, 'explanation': ''})
+
+    def test_import_round_trip(self):
+        rows = self.export()
+        rows.append({'topic': 'PAR', 'name': '', 'questions': []})
+
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'surveys.jsonl'
+            path.write_text('\n'.join(json.dumps(row) for row in rows))
+            out, err = StringIO(), StringIO()
+            call_command('import_surveys', str(path), '--user', 'userTestCase2',
+                    '--batch-size', '2', stdout=out, stderr=err)
+
+        self.assertIn('imported 3 surveys, skipped 1', out.getvalue())
+        self.assertIn('line 4 skipped', err.getvalue())
+
+        imported = Survey.objects.filter(user=self.importer)
+        self.assertEqual(imported.count(), 3)
+        self.assertEqual(Question.objects.filter(survey__in=imported).count(), 15)
+        self.assertEqual(
+                Choice.objects.filter(question__survey__in=imported, is_correct=True).count(),
+                15)
+        self.assertTrue(all(s.status == Survey.StateSurvey.ACCEPTED for s in imported))
+
+
+class TestExportAnswers(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        survey = create_mock_survey()
+        user = MockFactory.test_user(2)
+        for score in (10, 20, 30):
+            MockFactory.test_answer(user, survey, score)
+
+    def test_export_answers_as_json_lines(self):
+        out = StringIO()
+        call_command('export_answers', '--format', 'jsonl', '--chunk-size', '2',
+                stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['score'] for row in rows], [10, 20, 30])
+        self.assertEqual(rows[0]['username'], 'userTestCase2')
+
+
+class TestSweepSessions(TestCase):
+    def test_only_expired_sessions_are_deleted(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(
+                    session_key=f'expired{i}', session_data='',
+                    expire_date=now - timedelta(days=1))
+        Session.objects.create(
+                session_key='alive', session_data='',
+                expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command('sweep_sessions', '--batch-size', '2', stdout=out)
+
+        self.assertIn('deleted 5 expired sessions', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['alive'])
+
+
+class TestLoadTest(LiveServerTestCase):
+    def setUp(self):
+        plan_cache.clear()
+        create_mock_survey()
+
+    def test_full_games_are_played_without_errors(self):
+        # one user, the live server shares the in memory sqlite connection
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'report.json'
+            call_command('loadtest', '--url', self.live_server_url, '--users', '1',
+                    '--games', '2', '--topic', 'PAR', '--create-users',
+                    '--output', str(path), stdout=StringIO())
+            report = json.loads(path.read_text())
+
+        self.assertEqual(report['errors'], 0)
+        endpoints = report['endpoints']
+        self.assertEqual(endpoints['start']['requests'], 2)
+        self.assertEqual(endpoints['question_post']['requests'], 10)
+        self.assertEqual(endpoints['results']['requests'], 2)
+        self.assertIn('p99_ms', endpoints['results'])
+
+    def test_failed_logins_are_errors(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'report.json'
+            call_command('loadtest', '--url', self.live_server_url, '--users', '1',
+                    '--topic', 'PAR', '--output', str(path), stdout=StringIO())
+            report = json.loads(path.read_text())
+
+        login = report['endpoints']['login']
+        self.assertEqual(login['errors'], 1)
+        self.assertEqual(login['error_reasons'], {'redirect to /?failed-login=1': 1})
+        self.assertNotIn('start', report['endpoints'])
+
+
+class TestBenchAnswers(TransactionTestCase):
+    def test_answers_are_recorded_on_a_tuned_sqlite(self):
+        out = StringIO()
+        call_command('bench_answers', '--database', 'default', '--threads', '1',
+                '--inserts', '5', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['stored'], 5)
+        self.assertEqual(report['errors'], 0)
+        # synchronous=NORMAL comes from the connection_created hook
+        self.assertEqual(report['settings']['synchronous'], 1)
+        self.assertFalse(Answer.objects.exists())
+        self.assertFalse(User.objects.filter(username='bench-answers').exists())
+
+    def test_database_must_be_the_one_answers_are_written_to(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_answers', '--database', 'replica1', stdout=StringIO())
+
+
+class TestAnalyzeItems(TestCase):
+    # correct answers of each attempt to the five questions of the survey
+    PATTERNS = ((1, 1, 1, 1, 0), (1, 1, 0, 1, 0), (1, 0, 0, 0, 0), (1, 0, 1, 0, 0))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        for n, pattern in enumerate(cls.PATTERNS, start=2):
+            picks = {}
+            for question, correct in zip(cls.survey.questions, pattern):
+                pick = MockFactory.get_correct_choice if correct else MockFactory.get_wrong_choice
+                picks[question.id] = (pick(question).id, 10)
+            Answer.record(MockFactory.test_user(n), cls.survey.id, 10, picks)
+
+    def setUp(self):
+        plan_cache.clear()
+
+    def test_metrics_match_a_direct_computation(self):
+        out = StringIO()
+        # two attempts per chunk
+        call_command('analyze_items', '--chunk-size', '2', stdout=out)
+        self.assertIn('Analysed 5 questions from 20 responses', out.getvalue())
+
+        questions = self.survey.questions
+        analysis = QuestionAnalysis.objects.get(question=questions[1])
+        self.assertEqual(analysis.attempts, 4)
+        self.assertEqual(analysis.difficulty, 0.5)
+        item = [p[1] for p in self.PATTERNS]
+        rest = [sum(p) - p[1] for p in self.PATTERNS]
+        self.assertAlmostEqual(analysis.discrimination, statistics.correlation(item, rest))
+
+        # every attempt got the first and the last question alike
+        self.assertIsNone(QuestionAnalysis.objects.get(question=questions[0]).discrimination)
+        self.assertEqual(QuestionAnalysis.objects.get(question=questions[4]).difficulty, 0)
+
+        wrong = MockFactory.get_wrong_choice(questions[2])
+        self.assertEqual(ChoiceAnalysis.objects.get(choice=wrong).pick_rate, 0.5)
+        wrong = MockFactory.get_wrong_choice(questions[4])
+        self.assertEqual(ChoiceAnalysis.objects.get(choice=wrong).pick_rate, 1)
+
+    def test_analysis_is_replaced(self):
+        call_command('analyze_items', stdout=StringIO())
+        Answer.objects.all().delete()
+        call_command('analyze_items', stdout=StringIO())
+        self.assertFalse(QuestionAnalysis.objects.exists())
+        self.assertFalse(ChoiceAnalysis.objects.exists())
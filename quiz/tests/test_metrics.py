@@ -0,0 +1,66 @@
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+
+from qApp.metrics import PerformanceMiddleware, registry
+
+from quiz.models import Survey
+
+from .mocks import MockFactory, create_mock_survey
+
+
+class TestPerformanceMiddleware(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+
+    def setUp(self):
+        registry.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(f'/quiz/{self.survey.id}')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+
+    def test_histograms_are_kept_per_view(self):
+        self.client.get('/')
+        self.client.get('/')
+        self.client.get(f'/quiz/{self.survey.id}')
+
+        self.assertEqual(registry.views['index']['request_duration_seconds'].count, 2)
+        self.assertEqual(registry.views['survey']['db_queries'].count, 1)
+        self.assertGreater(registry.views['survey']['db_queries'].sum, 0)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get('/')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        self.client.force_login(MockFactory.test_superuser())
+        response = self.client.get('/metrics')
+        self.assertContains(response, '# TYPE qapp_request_duration_seconds histogram')
+        self.assertContains(response, 'qapp_request_duration_seconds_count{view="index"} 1')
+        self.assertContains(response, 'qapp_db_queries_bucket{view="index",le="+Inf"} 1')
+
+    async def test_async_views_are_timed_without_a_thread(self):
+        async def view(request):
+            return HttpResponse()
+
+        middleware = PerformanceMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'total;dur=[\d.]+')
+
+    def test_streamed_body_is_counted(self):
+        def chunks():
+            for _ in range(3):
+                yield str(Survey.objects.count())
+
+        middleware = PerformanceMiddleware(lambda request: StreamingHttpResponse(chunks()))
+        response = middleware(RequestFactory().get('/'))
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+        self.assertEqual(registry.views, {})
+
+        self.assertEqual(b''.join(response.streaming_content), b'111')
+        self.assertEqual(registry.views['unresolved']['db_queries'].sum, 3)
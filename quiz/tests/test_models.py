@@ -1,7 +1,28 @@
 from .mocks import MockChoice, MockFactory, create_mock_survey
 from .exceptions import PlayRoundException
-from django.test import TestCase
-from quiz.models import Choice, GameSession, Question, Survey
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from quiz.leaderboards import LEADERBOARD_SIZE, top_n
+from quiz.games import GameState
+from quiz.models import (
+        Answer,
+        Choice,
+        ChoiceStats,
+        Question,
+        QuestionResponse,
+        QuestionStats,
+        ScoreBucket,
+        Survey,
+        )
+from quiz.plans import QUESTION_TIME, PlanCache, SurveyPlan, plan_cache
+from quiz.writebehind import AnswerBuffer
 
 class TestSurveyCreation(TestCase):
     """ Test the Survey, Question, and Choice classes. """
@@ -63,3 +84,299 @@ class TestQuestionModel(TestCase):
             self.assertEqual(score, expected)
 
 
+
+class TestSurveyPlan(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey: Survey = create_mock_survey()
+        cls.questions_pk = [q.pk for q in cls.survey.questions]
+
+    def setUp(self):
+        plan_cache.clear()
+
+    def test_plan_follows_question_order(self):
+        plan = self.survey.plan
+        self.assertEqual(list(plan.question_ids), self.questions_pk)
+        self.assertEqual(plan.next_question_id(), self.questions_pk[0])
+        for current, following in zip(self.questions_pk, self.questions_pk[1:]):
+            self.assertEqual(plan.next_question_id(current), following)
+        self.assertIsNone(plan.next_question_id(self.questions_pk[-1]))
+
+    def test_game_order_is_rebuilt_from_the_seed(self):
+        plan = self.survey.plan
+        orders = {plan.question_order(seed) for seed in range(20)}
+        self.assertGreater(len(orders), 1)
+        for order in orders:
+            self.assertCountEqual(order, self.questions_pk)
+
+        self.assertEqual(plan.question_order(7), plan.question_order(7))
+        q_id = self.questions_pk[0]
+        self.assertEqual(plan.choice_order(q_id, 7), plan.choice_order(q_id, 7))
+        # games without seed keep the stored order
+        self.assertEqual(list(plan.question_order(None)), self.questions_pk)
+        self.assertEqual(plan.choice_order(q_id, None), (0, 1))
+
+    def test_plan_rejects_foreign_question(self):
+        with self.assertRaises(ValueError):
+            self.survey.plan.next_question_id(-1)
+
+    def test_cached_plan_needs_no_queries(self):
+        self.survey.plan
+        with self.assertNumQueries(0):
+            plan = Survey.get_plan(self.survey.pk)
+            plan.next_question_id(self.questions_pk[0])
+            plan.score(self.questions_pk[0], 0, 10)
+
+    def test_plan_is_invalidated_on_changes(self):
+        old_plan = self.survey.plan
+        question = Question.objects.get(pk=self.questions_pk[0])
+        wrong = MockFactory.get_wrong_choice(question)
+        wrong.is_correct = True
+        wrong.save()
+        Choice.objects.filter(question=question).exclude(pk=wrong.pk).delete()
+
+        plan = self.survey.plan
+        self.assertIsNot(plan, old_plan)
+        self.assertEqual(plan.answer_key[question.pk], wrong.pk)
+        self.assertEqual(len(plan.question(question.pk).choices), 1)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = PlanCache(maxsize=2)
+        plans = [
+            SurveyPlan.compile((i, 'name', 'TST', 1), [], [], version=1)
+            for i in range(3)]
+        for plan in plans:
+            cache.put(plan)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(0, 1))
+        self.assertIs(cache.get(2, 1), plans[2])
+        self.assertIsNone(cache.get(2, 2))
+
+class TestLeaderboard(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey: Survey = create_mock_survey()
+        cls.users = [MockFactory.test_user(n) for n in range(2, 8)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cold_board_is_built_from_answers(self):
+        for user, score in zip(self.users, [10, 50, 30]):
+            MockFactory.test_answer(user, self.survey, score)
+
+        board = Answer.top_n_answers(5, self.survey.pk)
+        self.assertEqual([e.score for e in board], [50, 30, 10])
+        self.assertEqual(board[0].username, self.users[1].username)
+
+    def test_warm_board_is_rebuilt_after_record(self):
+        Answer.top_n_answers(5, self.survey.pk)
+        for user, score in zip(self.users, [10, 50, 30, 50]):
+            Answer.record(user, self.survey.pk, score)
+
+        with self.assertNumQueries(1):
+            board = Answer.top_n_answers(5, self.survey.pk)
+
+        self.assertEqual([e.score for e in board], [50, 50, 30, 10])
+        self.assertEqual(board[0].username, self.users[1].username)
+        self.assertEqual(board[1].username, self.users[3].username)
+
+    def test_board_is_bounded(self):
+        Answer.top_n_answers(5, self.survey.pk)
+        for score in range(LEADERBOARD_SIZE + 5):
+            Answer.record(self.users[0], self.survey.pk, score)
+
+        board = Answer.top_n_answers(LEADERBOARD_SIZE + 5, self.survey.pk)
+        self.assertEqual(len(board), LEADERBOARD_SIZE)
+        self.assertEqual(board[0].score, LEADERBOARD_SIZE + 4)
+
+    def test_board_is_discarded_when_a_player_is_deleted(self):
+        Answer.record(self.users[0], self.survey.pk, 10)
+        Answer.top_n_answers(5, self.survey.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].delete()
+        self.assertEqual(Answer.top_n_answers(5, self.survey.pk), [])
+
+class TestScoreHistogram(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey: Survey = create_mock_survey()
+        cls.other: Survey = create_mock_survey()
+        cls.user = MockFactory.test_user(2)
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+
+    def record(self, survey, scores):
+        for score in scores:
+            Answer.record(self.user, survey.pk, score)
+
+    def test_standing_in_survey(self):
+        self.record(self.survey, [10, 20, 20, 30, 40])
+        standing = ScoreBucket.standing(30, survey_id=self.survey.pk)
+        self.assertEqual(standing, {'rank': 2, 'players': 5, 'percentile': 60})
+
+    def test_standing_in_topic(self):
+        self.record(self.survey, [10, 20])
+        self.record(self.other, [30, 40])
+        standing = ScoreBucket.standing(35, topic=self.survey.topic)
+        self.assertEqual(standing, {'rank': 2, 'players': 4, 'percentile': 75})
+
+    def test_standing_without_players(self):
+        standing = ScoreBucket.standing(35, survey_id=self.survey.pk)
+        self.assertIsNone(standing['percentile'])
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.record(self.survey, [10, 20, 20])
+        self.record(self.other, [20, 50])
+        incremental = set(ScoreBucket.objects.values_list(
+            'survey_id', 'topic', 'score', 'count'))
+
+        call_command('rebuild_histograms', stdout=StringIO())
+        rebuilt = set(ScoreBucket.objects.values_list(
+            'survey_id', 'topic', 'score', 'count'))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_deleted_survey_leaves_the_topic_histogram(self):
+        survey = create_mock_survey()
+        self.record(self.survey, [10, 20])
+        self.record(survey, [30])
+        with self.captureOnCommitCallbacks(execute=True):
+            survey.delete()
+        standing = ScoreBucket.standing(15, topic=self.survey.topic)
+        self.assertEqual(standing['players'], 2)
+
+    def test_deleted_player_leaves_the_histogram(self):
+        player = MockFactory.test_user(3)
+        self.record(self.survey, [10])
+        Answer.record(player, self.survey.pk, 20)
+        with self.captureOnCommitCallbacks(execute=True):
+            player.delete()
+        standing = ScoreBucket.standing(15, survey_id=self.survey.pk)
+        self.assertEqual(standing['players'], 1)
+
+    def test_deletes_only_rebuild_the_affected_histograms(self):
+        wetlands = create_mock_survey(Survey.SurveyTopics.WETLANDS)
+        self.record(wetlands, [10])
+        self.record(self.survey, [20])
+        # a drifted bucket of another survey and topic is left as it is
+        ScoreBucket.objects.filter(topic=wetlands.topic).update(count=5)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Survey.objects.filter(pk__in=[self.other.pk, self.survey.pk]).delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(set(ScoreBucket.objects.values_list('topic', 'count')),
+                {(wetlands.topic, 5)})
+
+
+@override_settings(QUIZ_WRITE_BEHIND=True)
+class TestWriteBehind(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.users = [MockFactory.test_user(n) for n in range(2, 5)]
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+        # drained by hand instead of by the background thread
+        self.buffer = AnswerBuffer(maxsize=2)
+        patcher = mock.patch('quiz.models.answer_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        mock.patch.object(self.buffer, 'start').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_answers_are_stored_in_one_batch(self):
+        for score, user in zip((10, 30), self.users):
+            self.assertTrue(Answer.record(user, self.survey.id, score).is_pending)
+        self.assertFalse(Answer.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 2)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "quiz_answer"')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(Answer.objects.filter(survey=self.survey).count(), 2)
+        self.assertEqual(ScoreBucket.standing(20, survey_id=self.survey.id)['players'], 2)
+        self.assertEqual([e.score for e in top_n(self.survey.id, 5)], [30, 10])
+
+    def test_full_queue_writes_synchronously(self):
+        with mock.patch('quiz.writebehind.PUT_TIMEOUT', 0.01):
+            answers = [Answer.record(user, self.survey.id, 10) for user in self.users]
+
+        self.assertEqual([a.is_pending for a in answers], [True, True, False])
+        self.assertEqual(Answer.objects.count(), 1)
+
+    def test_pending_score_counts_as_a_player(self):
+        MockFactory.test_answer(self.users[0], self.survey, 50)
+        ScoreBucket.rebuild()
+
+        standing = ScoreBucket.standing(20, survey_id=self.survey.id, pending=True)
+        self.assertEqual(standing, {'rank': 2, 'players': 2, 'percentile': 0})
+
+class TestQuestionStats(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.users = [MockFactory.test_user(n) for n in range(2, 4)]
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+
+    def picks(self, correct: bool) -> dict[int, tuple[int, int]]:
+        pick = MockFactory.get_correct_choice if correct else MockFactory.get_wrong_choice
+        return {q.id: (pick(q).id, 10) for q in self.survey.questions}
+
+    def test_responses_are_stored_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            Answer.record(self.users[0], self.survey.id, 50, self.picks(True))
+        inserts = [q for q in queries
+                if q['sql'].startswith('INSERT INTO "quiz_questionresponse"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(QuestionResponse.objects.filter(is_correct=True).count(), 5)
+
+    def test_stats_are_updated_incrementally(self):
+        Answer.record(self.users[0], self.survey.id, 50, self.picks(True))
+        Answer.record(self.users[1], self.survey.id, 0, self.picks(False))
+
+        question = self.survey.questions[0]
+        stats = QuestionStats.objects.get(question=question)
+        self.assertEqual((stats.attempts, stats.correct), (2, 1))
+        self.assertEqual(stats.percent_correct, 50)
+        self.assertEqual(stats.mean_time_left, 10)
+        wrong = MockFactory.get_wrong_choice(question)
+        self.assertEqual(ChoiceStats.objects.get(choice=wrong).picks, 1)
+
+        incremental = list(QuestionStats.objects.order_by('pk').values_list())
+        QuestionStats.rebuild()
+        self.assertEqual(list(QuestionStats.objects.order_by('pk').values_list()), incremental)
+
+    def test_foreign_choices_are_not_stored(self):
+        question = self.survey.questions[0]
+        Answer.record(self.users[0], self.survey.id, 0, {question.id: (0, 99)})
+        response = QuestionResponse.objects.get()
+        self.assertIsNone(response.choice_id)
+        self.assertFalse(response.is_correct)
+        self.assertEqual(response.time_left, QUESTION_TIME)
+
+    def test_game_state_keeps_the_picks(self):
+        state = GameState(self.survey.id)
+        state.play(7, 3, 12, 12)
+        restored = GameState.from_cache(state.to_cache())
+        self.assertEqual(restored.picks, {7: (3, 12)})
+        self.assertEqual(restored.total, 12)
+        # states saved before the picks were kept
+        self.assertEqual(GameState.from_cache((1, ((7, 12),))).picks, {})
+
+    def test_game_state_saved_before_the_seed_keeps_its_questions(self):
+        state = GameState.from_cache((None, (), (), 'PAR', ((1, 7), (2, 9))))
+        self.assertIsNone(state.seed)
+        self.assertEqual(state.topic, 'PAR')
+        self.assertEqual(state.next_question_id(), 7)
+
+        state = GameState(None, seed=5, topic='PAR', questions=((1, 7),))
+        self.assertEqual(GameState.from_cache(state.to_cache()), state)
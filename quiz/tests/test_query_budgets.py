@@ -0,0 +1,143 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from quiz.models import ScoreBucket, Survey
+from quiz.plans import plan_cache
+
+from .mocks import MockFactory, add_mock_questions, create_mock_survey, game_order
+
+# (surveys in the topic, questions in the played survey, answers to it)
+SIZES = ((1, 5, 1), (5, 20, 10), (20, 50, 40))
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Every view is measured with cold caches over fixtures of growing size, the
+    number of queries must not depend on the size of the data (no N+1) and
+    must stay within the budget of the view.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = MockFactory.test_user(2)
+        cls.admin = MockFactory.test_superuser()
+        cls.survey = create_mock_survey(Survey.SurveyTopics.WETLANDS)
+
+    def grow(self, surveys: int, questions: int, answers: int) -> None:
+        while Survey.objects.filter(topic=Survey.SurveyTopics.PARAMO).count() < surveys:
+            create_mock_survey()
+        add_mock_questions(self.survey, questions - self.survey.question_set.count())
+
+        start = self.survey.answer_set.count()
+        users = User.objects.bulk_create(
+                User(username=f"budget{n}") for n in range(start, answers))
+        for n, user in enumerate(users, start):
+            MockFactory.test_answer(user, self.survey, n)
+        ScoreBucket.rebuild()
+
+    def cold(self) -> None:
+        cache.clear()
+        plan_cache.clear()
+
+    def count_queries(self, request) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def assertQueryBudget(self, budget: int, prepare, request) -> None:
+        counts = []
+        for size in SIZES:
+            self.grow(*size)
+            self.cold()
+            prepare()
+            counts.append(self.count_queries(request))
+
+        self.assertEqual(len(set(counts)), 1, f"queries grow with the data: {counts}")
+        self.assertLessEqual(counts[0], budget)
+
+    def login(self, user: User | None = None) -> None:
+        self.client.force_login(user or self.player)
+
+    def start_game(self) -> None:
+        self.login()
+        self.client.post('/quiz/start', {'topic': self.survey.topic})
+        self.order = game_order(self.client, self.survey)
+        plan_cache.clear()
+
+
+class TestPageBudgets(QueryBudgetTestCase):
+    def test_index(self):
+        # the user, the session is read from the cache
+        self.assertQueryBudget(1, self.login, lambda: self.client.get('/'))
+
+    def test_list_surveys(self):
+        self.assertQueryBudget(
+                2, lambda: self.login(self.admin),
+                lambda: self.client.get('/surveys/list'))
+
+    def test_list_surveys_by_topic(self):
+        self.assertQueryBudget(
+                2, lambda: self.login(self.admin),
+                lambda: self.client.get('/surveys/list', {'topic': 'PAR'}))
+
+    def test_survey_details(self):
+        url = f'/surveys/list/{self.survey.topic}/{self.survey.id}'
+        # the user, the survey, its plan, its questions and their choices
+        self.assertQueryBudget(
+                5, lambda: self.login(self.admin), lambda: self.client.get(url))
+
+
+class TestGameBudgets(QueryBudgetTestCase):
+    def test_start(self):
+        self.assertQueryBudget(
+                4, self.login,
+                lambda: self.client.post('/quiz/start', {'topic': self.survey.topic}))
+
+    def test_survey(self):
+        self.assertQueryBudget(
+                2, self.start_game,
+                lambda: self.client.get(f'/quiz/{self.survey.id}'))
+
+    def first_question_url(self) -> str:
+        return f'/quiz/{self.survey.id}/questions/{self.order[0]}'
+
+    def test_question_get(self):
+        self.assertQueryBudget(
+                2, self.start_game, lambda: self.client.get(self.first_question_url()))
+
+    def test_question_post(self):
+        # only the plan, the game lives in the cache
+        self.assertQueryBudget(
+                1, self.start_game,
+                lambda: self.client.post(self.first_question_url(),
+                    {'choice': 0, 'timerVal': 10}))
+
+    def test_last_question_post(self):
+        def prepare():
+            self.start_game()
+            *played, last = self.order
+            for q_id in played:
+                self.client.post(f'/quiz/{self.survey.id}/questions/{q_id}',
+                        {'choice': 0, 'timerVal': 10})
+            self.last_url = f'/quiz/{self.survey.id}/questions/{last}'
+            plan_cache.clear()
+
+        # the answer with its responses and question statistics in a
+        # savepoint, the score histograms and the session
+        self.assertQueryBudget(
+                13, prepare,
+                lambda: self.client.post(self.last_url, {'choice': 0, 'timerVal': 10}))
+
+    def test_results(self):
+        def prepare():
+            self.login()
+            session = self.client.session
+            session['score'] = 50
+            session.save()
+
+        self.assertQueryBudget(
+                8, prepare,
+                lambda: self.client.get(f'/quiz/{self.survey.id}/results'))
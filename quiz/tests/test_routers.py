@@ -0,0 +1,84 @@
+import asyncio
+from contextvars import copy_context
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.db import transaction
+
+from qApp.routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinningMiddleware
+from quiz.leaderboards import leaderboard_rows
+from quiz.models import Answer, Survey
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class TestPrimaryReplicaRouter(TransactionTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def serve(self, view, **cookies):
+        """ Run the view behind the middleware in a fresh context, as a request. """
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies)
+        middleware = ReplicaPinningMiddleware(view)
+        return copy_context().run(middleware, request)
+
+    def test_reads_go_to_a_replica(self):
+        def view(request):
+            self.assertIn(self.router.db_for_read(Answer), ['replica1', 'replica2'])
+            return HttpResponse()
+
+        response = self.serve(view)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        def view(request):
+            self.assertEqual(self.router.db_for_write(Answer), 'default')
+            self.assertEqual(self.router.db_for_read(Answer), 'default')
+            return HttpResponse()
+
+        response = self.serve(view)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+    def test_pinned_clients_read_from_the_primary(self):
+        def view(request):
+            self.assertEqual(self.router.db_for_read(Survey), 'default')
+            return HttpResponse()
+
+        self.serve(view, **{PIN_COOKIE: '1'})
+
+    def test_reads_inside_a_transaction_go_to_the_primary(self):
+        def view(request):
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Survey), 'default')
+            return HttpResponse()
+
+        self.serve(view)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'quiz'))
+        self.assertTrue(self.router.allow_migrate('default', 'quiz'))
+
+    def test_reads_that_fill_a_cache_use_the_primary(self):
+        self.assertEqual(Survey.plan_rows(1).db, 'default')
+        self.assertEqual(leaderboard_rows(1).db, 'default')
+
+    def test_related_reads_follow_their_instance(self):
+        def view(request):
+            survey = Survey(pk=1)
+            survey._state.db = 'replica2'
+            self.assertEqual(self.router.db_for_read(Answer, instance=survey), 'replica2')
+            return HttpResponse()
+
+        self.serve(view)
+
+    def test_async_requests_are_pinned_after_a_write(self):
+        async def view(request):
+            self.assertEqual(self.router.db_for_write(Answer), 'default')
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(self.factory.get('/')))
+        self.assertIn(PIN_COOKIE, response.cookies)
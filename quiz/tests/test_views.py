@@ -1,10 +1,28 @@
+import json
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.test import Client, RequestFactory, TestCase
 from django.urls import reverse
 
-from quiz.views import CreateSurveyView, EndView, QuestionView, StartView
-from quiz.models import Survey, Question, Choice
+from quiz.views import CreateSurveyView, QuestionView, StartView
+from quiz.models import Answer, Survey, Question, Choice, ScoreBucket
+from quiz.plans import QUESTION_TIME, plan_cache
+from quiz.pools import (
+        question_pool,
+        random_survey_id_sql,
+        sample_questions,
+        topic_pool,
+        warm_topic_pool,
+        )
 
-from .mocks import MockFactory, MockRequest, create_mock_survey
+from .mocks import (
+        MockFactory,
+        MockRequest,
+        add_mock_questions,
+        create_mock_survey,
+        game_order,
+        )
 
 class TestIndexView(TestCase):
     @classmethod
@@ -43,6 +61,7 @@ class TestCreateView(TestCase):
     def test_process_request(self):
         POST_data = {
             'topic': 'TST',
+            'name': 'TST',
             'question-0-question_text': 'TestQuestion1',
             'question-0-choice_set': 'choice-1',
             'question-0-choice-0-choice_text': 'Choice1',
@@ -51,6 +70,7 @@ class TestCreateView(TestCase):
         expected = {
                 'survey': {
                     'topic': 'TST',
+                    'name': 'TST',
                     'user': self.user,
                 },
                 'question-0': {
@@ -70,6 +90,112 @@ class TestCreateView(TestCase):
         
         self.assertDictEqual(result, expected)
 
+    def test_form_creates_the_survey_in_one_transaction(self):
+        self.client.login(username="userTestCase1", password="pass")
+        POST_data = {
+            'topic': 'PAR',
+            'name': 'Form survey',
+            'question-0-question_text': 'TestQuestion1',
+            'question-0-choice-0-choice_text': 'Choice1',
+            'question-0-choice_set': 'choice-1',
+            'question-0-choice-1-choice_text': 'Choice2',
+            'question-1-question_text': 'TestQuestion2',
+            'question-1-choice-0-choice_text': '',
+        }
+        response = self.client.post('/create-survey', POST_data)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Survey.objects.exists())
+
+        POST_data['question-1-choice-0-choice_text'] = 'Choice3'
+        response = self.client.post('/create-survey', POST_data)
+        self.assertRedirects(response, '/surveys/list')
+        survey = Survey.objects.get()
+        plan = survey.plan
+        first = plan.question(plan.question_ids[0])
+        self.assertEqual(plan.answer_key[first.id], first.choices[1].id)
+
+class TestCreateSurveyAPIView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MockFactory.test_user(1)
+
+    def setUp(self):
+        self.client.login(username="userTestCase1", password="pass")
+
+    def payload(self, n_questions: int = 3) -> dict:
+        return {
+            'topic': 'PAR',
+            'name': 'API survey',
+            'questions': [
+                {
+                    'question_text': f'Question {i}',
+                    'choices': [
+                        {'choice_text': 'Right', 'is_correct': True},
+                        {'choice_text': 'Wrong', 'explanation': 'Nope'},
+                    ],
+                } for i in range(n_questions)],
+        }
+
+    def post(self, payload, key: str | None = None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(
+                '/api/surveys', payload, content_type='application/json',
+                headers=headers)
+
+    def test_survey_is_created_with_bulk_inserts(self):
+        # user, savepoint, survey, questions, choices, release
+        with self.assertNumQueries(6):
+            response = self.post(self.payload(50))
+
+        self.assertEqual(response.status_code, 201)
+        survey = Survey.objects.get(pk=response.json()['id'])
+        self.assertEqual(survey.question_set.count(), 50)
+        self.assertEqual(Choice.objects.filter(question__survey=survey).count(), 100)
+        self.assertEqual(len(survey.plan), 50)
+
+    def test_invalid_survey_creates_nothing(self):
+        payload = self.payload()
+        payload['questions'][1]['choices'][0]['choice_text'] = ''
+        response = self.post(payload)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('question-1-choice-0: text is required', response.json()['errors'])
+        self.assertFalse(Survey.objects.exists())
+
+    def test_retries_with_idempotency_key_create_one_survey(self):
+        first = self.post(self.payload(), 'abc')
+        second = self.post(self.payload(), 'abc')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertEqual(Survey.objects.count(), 1)
+
+    def test_anonymous_users_are_rejected(self):
+        self.client.logout()
+        self.assertEqual(self.post(self.payload()).status_code, 401)
+
+    def test_csrf_token_is_handed_out_by_the_get(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username="userTestCase1", password="pass")
+        response = client.get('/api/surveys')
+        self.assertIn('PAR', response.json()['topics'])
+
+        response = client.post(
+                '/api/surveys', self.payload(), content_type='application/json',
+                headers={'X-CSRFToken': client.cookies['csrftoken'].value})
+        self.assertEqual(response.status_code, 201)
+
+    def test_long_idempotency_keys_are_rejected(self):
+        response = self.post(self.payload(), 'k' * 65)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Survey.objects.exists())
+
+    def test_malformed_body_is_reported(self):
+        response = self.client.post(
+                '/api/surveys', '{"topic":', content_type='application/json')
+        self.assertEqual(response.json()['errors'], ['body is not valid JSON'])
+
 class TestStartView(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -89,6 +215,10 @@ class TestStartView(TestCase):
             survey.save()
 
 
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+
     def test_only_accepted_surveys_selected(self):
         survey = self.view.get_random_survey_from_topic('PAR')
         self.assertIsNotNone(survey)
@@ -104,6 +234,42 @@ class TestStartView(TestCase):
         response = self.client.post('/quiz/start',{'topic':'PAR'})
         self.assertRedirects(response, '/?failed=1')
 
+    def test_cold_pool_falls_back_to_sql(self):
+        self.assertIsNone(topic_pool('PAR'))
+        survey_id = random_survey_id_sql('PAR')
+        self.assertIn(survey_id, [s.id for s in self.surveys[2:]])
+
+        self.view.get_random_survey_from_topic('PAR')
+        self.assertCountEqual(topic_pool('PAR'), [s.id for s in self.surveys[2:]])
+
+    def test_warm_pool_selection_needs_no_queries(self):
+        for survey in self.surveys[2:]:
+            survey.plan
+        warm_topic_pool('PAR')
+
+        with self.assertNumQueries(0):
+            survey = self.view.get_random_survey_from_topic('PAR')
+        self.assertEqual(survey.status, Survey.StateSurvey.ACCEPTED)
+
+    def test_pool_follows_status_changes(self):
+        warm_topic_pool('PAR')
+        rejected, accepted = self.surveys[2], self.surveys[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rejected.status = Survey.StateSurvey.REVIEW
+            rejected.save()
+        self.assertIsNone(topic_pool('PAR'))
+
+        warm_topic_pool('PAR')
+        with self.captureOnCommitCallbacks(execute=True):
+            accepted.status = Survey.StateSurvey.ACCEPTED
+            accepted.save()
+        self.assertIsNone(topic_pool('PAR'))
+
+        pool = warm_topic_pool('PAR')
+        self.assertNotIn(rejected.id, pool)
+        self.assertIn(accepted.id, pool)
+
 class TestQuestionView(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -112,26 +278,421 @@ class TestQuestionView(TestCase):
         cls.survey = create_mock_survey()
 
     def test_game_starts(self):
-        self.client.post('/quiz/start', {'topic':'PAR'})
-        self.client.post('/quiz/start')
-        response = self.client.get('/quiz/1/play')
-        self.assertContains(response, '/quiz/1/play?ready=1&amp;question=1')
+        response = self.client.post('/quiz/start', {'topic':'PAR'})
+        self.assertRedirects(response, f'/quiz/{self.survey.id}')
+
+        first = game_order(self.client, self.survey)[0]
+        response = self.client.get(f'/quiz/{self.survey.id}')
+        self.assertContains(response, f'{self.survey.id}/questions/{first}')
 
     def test_game_loops_correctly(self):
         self.client.post('/quiz/start', {'topic':'PAR'})
-        self.client.get('/quiz/1/play')
-        for i in range(1,5):
-            response = self.client.post(f'/quiz/1/play?ready=1&amp;question={i}')
-            self.assertContains(response, f'/quiz/1/play?ready=1&amp;question={i+1}')
+        questions = game_order(self.client, self.survey)
+        for current, following in zip(questions, questions[1:]):
+            response = self.client.post(
+                    f'/quiz/{self.survey.id}/questions/{current}',
+                    {'choice': 0, 'timerVal': 10})
+            self.assertRedirects(
+                    response,
+                    f'/quiz/{self.survey.id}/questions/{following}',
+                    fetch_redirect_response=False)
+
+    def test_game_steps_do_not_write_the_session(self):
+        self.client.post('/quiz/start', {'topic':'PAR'})
+        first, second = game_order(self.client, self.survey)[:2]
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                    f'/quiz/{self.survey.id}/questions/{first}',
+                    {'choice': 0, 'timerVal': 10})
+        self.assertRedirects(
+                response,
+                f'/quiz/{self.survey.id}/questions/{second}',
+                fetch_redirect_response=False)
+
+    def test_more_games_than_the_default_cache_holds_are_finished(self):
+        # the LocMem default cache culls past its 300 MAX_ENTRIES
+        clients = [Client() for _ in range(400)]
+        for client in clients:
+            client.post('/quiz/start', {'topic': 'PAR'})
+
+        for client in clients:
+            for q_id in game_order(client, self.survey):
+                response = client.post(
+                        f'/quiz/{self.survey.id}/questions/{q_id}',
+                        {'choice': 0, 'timerVal': 10})
+            self.assertRedirects(
+                    response, f'/quiz/{self.survey.id}/results',
+                    fetch_redirect_response=False)
+
+    def test_steps_without_a_game_go_back_home(self):
+        question = self.survey.questions[0]
+        response = self.client.post(
+                f'/quiz/{self.survey.id}/questions/{question.id}',
+                {'choice': 0, 'timerVal': 10})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
 
     def test_game_ended(self):
         self.client.post('/quiz/start', {'topic':'PAR'})
-        self.client.get('/quiz/1/play', {'first': 1})
-        for i in range(1,5):
-            data = {'id':i}
-            response = self.client.post(f'/quiz/1/play?ready=1&amp;question={i}', data)
-        response = self.client.post(f'/quiz/1/play?ready=1&amp;question=5', {'id':5})
-        self.assertContains(response, '/quiz/1/finish')
+        for question in game_order(self.client, self.survey):
+            response = self.client.post(
+                    f'/quiz/{self.survey.id}/questions/{question}',
+                    {'choice': 0, 'timerVal': 10})
+        self.assertRedirects(response, f'/quiz/{self.survey.id}/results')
+
+    def test_questions_are_answered_in_the_game_order(self):
+        self.client.post('/quiz/start', {'topic':'PAR'})
+        first, second, *_ = game_order(self.client, self.survey)
+        response = self.client.post(
+                f'/quiz/{self.survey.id}/questions/{second}',
+                {'choice': 0, 'timerVal': 10})
+        self.assertRedirects(
+                response, f'/quiz/{self.survey.id}/questions/{first}',
+                fetch_redirect_response=False)
+
+        # a question is scored once
+        url = f'/quiz/{self.survey.id}/questions/{first}'
+        self.client.post(url, {'choice': 0, 'timerVal': 10})
+        response = self.client.post(url, {'choice': 0, 'timerVal': 10})
+        self.assertRedirects(
+                response, f'/quiz/{self.survey.id}/questions/{second}',
+                fetch_redirect_response=False)
+
+    def test_choices_follow_the_game_order(self):
+        add_mock_questions(self.survey, 15)
+        self.client.post('/quiz/start', {'topic':'PAR'})
+        plan = Survey.get_plan(self.survey.id)
+        shuffled = 0
+        for q_id in game_order(self.client, self.survey):
+            response = self.client.get(f'/quiz/{self.survey.id}/questions/{q_id}')
+            ids = [c.id for c in response.context['choices']]
+            self.assertCountEqual(ids, [c.id for c in plan.question(q_id).choices])
+            shuffled += ids != [c.id for c in plan.question(q_id).choices]
+            self.client.post(f'/quiz/{self.survey.id}/questions/{q_id}',
+                    {'choice': 0, 'timerVal': 10})
+        # two choices per question, a fixed order would be 1 in 2**20
+        self.assertGreater(shuffled, 0)
+
+class TestQuestionPageQueries(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.other_survey = create_mock_survey()
+
+    def setUp(self):
+        plan_cache.clear()
+        self.question = self.survey.questions[0]
+        self.url = f'/quiz/{self.survey.id}/questions/{self.question.id}'
+
+    def test_question_page_renders_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertContains(response, self.question.question_text)
+        for choice in self.question.choice_set.all():
+            self.assertContains(response, f'value="{choice.id}"')
+
+    def test_cached_question_page_needs_no_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_question_must_belong_to_survey(self):
+        foreign = self.other_survey.questions[0]
+        response = self.client.get(
+                f'/quiz/{self.survey.id}/questions/{foreign.id}')
+        self.assertEqual(response.status_code, 404)
+
+class TestFragmentCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.superuser = MockFactory.test_superuser()
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+
+    def test_question_fragments_follow_the_survey_version(self):
+        question = self.survey.questions[0]
+        url = f'/quiz/{self.survey.id}/questions/{question.id}'
+        self.client.get(url)
+
+        # without a game the choices keep their stored order
+        key = make_template_fragment_key(
+                'quiz-choices', [self.survey.id, self.survey.version, question.id, '0-1'])
+        self.assertIsNotNone(cache.get(key))
+
+        choice = MockFactory.get_wrong_choice(question)
+        choice.choice_text = 'Edited'
+        choice.save()
+        self.assertIsNone(cache.get(make_template_fragment_key(
+                'quiz-choices', [self.survey.id, self.survey.version, question.id, '0-1'])))
+        self.assertContains(self.client.get(url), 'Edited')
+
+    def test_survey_detail_questions_are_cached(self):
+        self.client.login(username="super", password="pass")
+        url = f'/surveys/list/PAR/{self.survey.id}'
+        self.client.get(url)
+
+        # user and survey, the question list comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'QUESTION 4')
+
+        question = self.survey.questions[4]
+        question.question_text = 'Edited question'
+        question.save()
+        self.assertContains(self.client.get(url), 'EDITED QUESTION')
+
+class TestSurveyDetailsView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        add_mock_questions(cls.survey, 120)
+        cls.superuser = MockFactory.test_superuser()
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+        self.client.force_login(self.superuser)
+        self.url = f'/surveys/list/PAR/{self.survey.id}'
+
+    def test_large_survey_is_streamed_and_cached(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('class="question-container"'), 125)
+        self.assertIn('QUESTION 124', content)
+        self.assertTrue(content.rstrip().endswith('</html>'))
+
+        response = self.client.get(self.url)
+        self.assertFalse(response.streaming)
+        self.assertContains(response, 'class="question-container"', count=125)
+
+    def test_status_change_redirects(self):
+        response = self.client.post(self.url, {'status': Survey.StateSurvey.REVIEW})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.status, Survey.StateSurvey.REVIEW)
+
+    def test_only_superusers_change_the_status(self):
+        self.client.force_login(MockFactory.test_user(2))
+        response = self.client.post(self.url, {'status': Survey.StateSurvey.REVIEW})
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_status_is_rejected(self):
+        response = self.client.post(self.url, {'status': '7'})
+        self.assertEqual(response.status_code, 400)
+
+class TestSurveyStatsView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.user = MockFactory.test_user(2)
+        picks = {q.id: (MockFactory.get_correct_choice(q).id, 10)
+                for q in cls.survey.questions}
+        Answer.record(cls.user, cls.survey.id, 50, picks)
+        cls.url = f'/surveys/list/PAR/{cls.survey.id}/stats'
+
+    def test_author_sees_the_statistics(self):
+        self.client.force_login(self.survey.user)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertContains(response, '100%', count=5)
+
+    def test_queries_do_not_grow_with_the_questions(self):
+        self.client.force_login(self.survey.user)
+        add_mock_questions(self.survey, 20)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Sin respuestas', count=20)
+
+    def test_other_players_are_not_allowed(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+class TestQuestionBank(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.surveys = [create_mock_survey() for _ in range(3)]
+        cls.review = create_mock_survey()
+        cls.review.status = Survey.StateSurvey.REVIEW
+        cls.review.save()
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+
+    def play(self, answer: bool = True) -> list[tuple[int, int]]:
+        """
+        Play a whole bank game picking the correct choices, or letting every
+        timer run out, return its questions.
+        """
+        response = self.client.post('/quiz/bank/start', {'topic': 'PAR'})
+        self.assertRedirects(response, '/quiz/bank', fetch_redirect_response=False)
+        questions = []
+        url = self.client.get('/quiz/bank').context['question_url']
+        while url.startswith('/quiz/bank/questions/'):
+            question = Question.objects.get(pk=int(url.rsplit('/', 1)[1]))
+            questions.append((question.survey_id, question.id))
+            choice = MockFactory.get_correct_choice(question).id if answer else 0
+            url = self.client.post(url, {'choice': choice, 'timerVal': 10}).url
+        self.assertEqual(url, '/quiz/bank/results')
+        return questions
+
+    def test_questions_are_sampled_across_accepted_surveys(self):
+        questions = sample_questions('PAR', 10)
+        self.assertEqual(len(set(questions)), 10)
+        self.assertNotIn(self.review.id, {s_id for s_id, _ in questions})
+        self.assertEqual(len(question_pool('PAR')), 15)
+        self.assertEqual(len(sample_questions('PAR', 100)), 15)
+
+    def test_pool_follows_the_survey_status(self):
+        sample_questions('PAR', 10)
+        self.review.status = Survey.StateSurvey.ACCEPTED
+        self.review.save()
+        self.assertIsNone(question_pool('PAR'))
+        self.assertEqual(len(sample_questions('PAR', 100)), 20)
+
+    def test_only_the_pools_of_the_survey_topic_are_dropped(self):
+        create_mock_survey(Survey.SurveyTopics.WETLANDS)
+        sample_questions('PAR', 1)
+        sample_questions('HUM', 1)
+
+        question = self.surveys[0].questions[0]
+        question.question_text = 'Edited'
+        question.save()
+        self.assertIsNotNone(question_pool('PAR'))
+
+        Question.objects.create(survey=self.surveys[0], question_text='New')
+        self.assertIsNone(question_pool('PAR'))
+        self.assertIsNotNone(question_pool('HUM'))
+
+        sample_questions('PAR', 1)
+        survey = Survey.objects.get(pk=self.surveys[0].pk)
+        survey.topic = Survey.SurveyTopics.CORAL_REEF
+        survey.save()
+        self.assertIsNone(question_pool('PAR'))
+        self.assertIsNotNone(question_pool('HUM'))
+
+    def test_unanswered_questions_without_key_are_not_correct(self):
+        Choice.objects.update(is_correct=False)
+        self.play(answer=False)
+        response = self.client.get('/quiz/bank/results')
+        self.assertContains(response, 'ACERTASTE 0 DE 10 PREGUNTAS')
+
+    def test_bank_game_is_scored(self):
+        questions = self.play()
+        self.assertEqual(len(questions), 10)
+        response = self.client.get('/quiz/bank/results')
+        self.assertContains(response, 'ACERTASTE 10 DE 10 PREGUNTAS')
+        self.assertEqual(response.context['score'], 100)
+        # practice rounds are not stored as answers
+        self.assertFalse(Answer.objects.exists())
+
+    def test_steps_need_no_queries(self):
+        self.client.post('/quiz/bank/start', {'topic': 'PAR'})
+        url = self.client.get('/quiz/bank').context['question_url']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.client.post(url, {'choice': 0, 'timerVal': 10})
+
+    def test_questions_outside_the_game_are_not_found(self):
+        self.client.post('/quiz/bank/start', {'topic': 'PAR'})
+        question = self.review.questions[0]
+        response = self.client.get(f'/quiz/bank/questions/{question.id}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_empty_topic_fails(self):
+        response = self.client.post('/quiz/bank/start', {'topic': 'COR'})
+        self.assertRedirects(response, '/?failed=1', fetch_redirect_response=False)
+
+class TestQuizAPIView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.other = create_mock_survey()
+        cls.user = MockFactory.test_user(2)
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+        self.url = f'/api/quiz/{self.survey.id}'
+
+    def submit(self, answers):
+        self.client.get(self.url)
+        return self.client.post(
+                self.url, {'answers': answers}, content_type='application/json')
+
+    def test_playable_survey_has_no_answer_key(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        data = response.json()
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(len(data['questions'][0]['choices']), 2)
+        self.assertNotIn('is_correct', response.content.decode())
+
+    def test_attempt_is_scored_at_once(self):
+        self.client.login(username="userTestCase2", password="pass")
+        answers = []
+        for i, question in enumerate(self.survey.questions):
+            pick = MockFactory.get_correct_choice(question) if i % 2 == 0 \
+                    else MockFactory.get_wrong_choice(question)
+            answers.append({'question': question.id, 'choice': pick.id, 'timer': 10})
+
+        response = self.submit(answers)
+        self.assertEqual(response.json()['score'], 30)
+        self.assertEqual(Answer.objects.get(user=self.user).score, 30)
+
+        response = self.client.get(response.json()['results_url'])
+        self.assertContains(response, '30')
+
+    def test_timers_are_bounded(self):
+        question = self.survey.questions[0]
+        choice = MockFactory.get_correct_choice(question)
+        response = self.submit([{'question': question.id, 'choice': choice.id, 'timer': 1000}])
+        self.assertEqual(response.json()['score'], QUESTION_TIME)
+
+    def test_foreign_questions_are_rejected(self):
+        foreign = self.other.questions[0]
+        response = self.submit([{'question': foreign.id, 'choice': 0, 'timer': 10}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_then_post_passes_the_csrf_checks(self):
+        client = Client(enforce_csrf_checks=True)
+        client.get(self.url)
+        question = self.survey.questions[0]
+        response = client.post(
+                self.url, {'answers': [{'question': question.id, 'choice': 0}]},
+                content_type='application/json',
+                headers={'X-CSRFToken': client.cookies['csrftoken'].value})
+        self.assertEqual(response.status_code, 200)
+
+    def test_attempt_needs_a_game(self):
+        question = self.survey.questions[0]
+        answers = [{'question': question.id, 'choice': 0, 'timer': 10}]
+        response = self.client.post(
+                self.url, {'answers': answers}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.get(f'/api/quiz/{self.other.id}')
+        response = self.client.post(
+                self.url, {'answers': answers}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_game_ends_with_the_attempt(self):
+        question = self.survey.questions[0]
+        choice = MockFactory.get_correct_choice(question)
+        answers = [{'question': question.id, 'choice': choice.id, 'timer': 10}]
+        response = self.submit(answers)
+        self.assertNotIn('questions', response.json())
+
+        response = self.client.post(
+                self.url, {'answers': answers}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
 
 class TestEndView(TestCase):
      def test_not_answers_in_session_cache(self):
@@ -139,15 +700,124 @@ class TestEndView(TestCase):
         Redirect to index if the view is access without have complete a
         survey
         """
-        request = RequestFactory().get('/quiz/finish')
-        request.session = {'answers': None}
-        response = EndView.as_view()(request)
+        survey = create_mock_survey()
+        response = self.client.get(f'/quiz/{survey.id}/results')
         self.assertRedirects(response,'/', fetch_redirect_response=False)
 
-class TestResultsView:
-    """
-    Empty Class. The results view just render a template and don't have
-    really logic to be tested at the moment.
-    """
-    pass
+class TestResultsView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.users = [MockFactory.test_user(n) for n in range(2, 9)]
+        for score, user in enumerate(cls.users):
+            MockFactory.test_answer(user, cls.survey, score * 10)
+        ScoreBucket.rebuild()
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+
+    def play(self):
+        session = self.client.session
+        session['score'] = 15
+        session.save()
+
+    def test_leaderboard_shows_top_five(self):
+        self.play()
+        response = self.client.get(f'/quiz/{self.survey.id}/results')
+        for user in self.users[-5:]:
+            self.assertContains(response, user.username)
+        for user in self.users[:2]:
+            self.assertNotContains(response, user.username)
+
+    def test_results_show_percentile(self):
+        self.play()
+        response = self.client.get(f'/quiz/{self.survey.id}/results')
+        self.assertContains(response, 'SUPERASTE AL')
+
+    def test_leaderboard_has_no_per_row_queries(self):
+        self.play()
+        self.client.get(f'/quiz/{self.survey.id}/results')
+        self.play()
+        # the session save inside a savepoint, plus one query per histogram
+        with self.assertNumQueries(5):
+            self.client.get(f'/quiz/{self.survey.id}/results')
+
+
+class TestListSurveysView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.surveys = [create_mock_survey() for _ in range(12)]
+        cls.surveys.append(create_mock_survey(Survey.SurveyTopics.WETLANDS))
+        cls.admin = MockFactory.test_superuser()
+        MockFactory.test_answer(cls.admin, cls.surveys[-1], 10)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_cursor_walks_every_survey_once(self):
+        seen, params = [], {}
+        while True:
+            response = self.client.get('/surveys/list', params)
+            seen += [s.id for s in response.context['object_list']]
+            if response.context['next_cursor'] is None:
+                break
+            params = {'cursor': response.context['next_cursor']}
+
+        expected = sorted(self.surveys, key=lambda s: (s.creation_date, s.id), reverse=True)
+        self.assertEqual(seen, [s.id for s in expected])
+
+    def test_counts_are_annotated(self):
+        response = self.client.get('/surveys/list')
+        newest = response.context['object_list'][0]
+        self.assertEqual((newest.question_count, newest.play_count), (5, 1))
+        self.assertContains(response, 'SIGUIENTE')
 
+    def test_topic_filter(self):
+        response = self.client.get('/surveys/list', {'topic': 'HUM'})
+        self.assertEqual(list(response.context['object_list']), [self.surveys[-1]])
+
+    def test_unrelated_query_string_is_ignored(self):
+        response = self.client.get('/surveys/list', {'cursor': 'junk', 'page': '2'})
+        self.assertEqual(len(response.context['object_list']), 10)
+
+
+class TestExportAnswersView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.survey = create_mock_survey()
+        cls.other = create_mock_survey(Survey.SurveyTopics.WETLANDS)
+        cls.user = MockFactory.test_user(2)
+        for score in (10, 20, 30):
+            MockFactory.test_answer(cls.user, cls.survey, score)
+        MockFactory.test_answer(cls.user, cls.other, 40)
+
+    def test_only_staff_can_export(self):
+        self.client.login(username="userTestCase2", password="pass")
+        response = self.client.get('/answers/export')
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_is_streamed_and_filtered(self):
+        MockFactory.test_superuser()
+        self.client.login(username="super", password="pass")
+
+        response = self.client.get('/answers/export', {'topic': 'PAR'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,survey_id,topic,username,score,creation_date')
+        self.assertEqual(len(lines), 4)
+
+        response = self.client.get('/answers/export', {
+            'format': 'jsonl', 'survey': self.other.id, 'since': '2000-01-01'})
+        rows = [json.loads(line) for line in response.streaming_content]
+        self.assertEqual([row['score'] for row in rows], [40])
+
+        response = self.client.get('/answers/export', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_parameters_are_not_echoed_as_html(self):
+        MockFactory.test_superuser()
+        self.client.login(username="super", password="pass")
+        response = self.client.get('/answers/export', {'format': '<script>'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
@@ -1,29 +1,57 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth.views import LogoutView
 
 from .views import (
+        BankQuestionView,
+        BankResultsView,
+        BankStartView,
+        BankView,
         IndexView,
         QLoginView,
         CreateSurveyView,
+        CreateSurveyAPIView,
+        ExportAnswersView,
         StartView,
         QuestionView,
+        QuizAPIView,
         ResultsView,
         ListSurveysView,
         SurveyDetailsView,
+        SurveyStatsView,
         SurveyView,
         )
 
+if settings.QUIZ_ASYNC_VIEWS:
+    from .async_views import (
+            AsyncQuestionView as QuestionView,
+            AsyncResultsView as ResultsView,
+            AsyncStartView as StartView,
+            AsyncSurveyView as SurveyView,
+            )
+
 urlpatterns = [
         path('', IndexView.as_view(), name='index'),
         path('accounts/login/', QLoginView.as_view(), name='login'),
         path('accounts/logout/', LogoutView.as_view(), name='login'),
         path('quiz/start', StartView.as_view(), name='start'),
         path('quiz/<int:id>', SurveyView.as_view(), name='survey'),
+        path('quiz/bank/start', BankStartView.as_view(), name='bank-start'),
+        path('quiz/bank', BankView.as_view(), name='bank'),
+        path('quiz/bank/questions/<int:q_id>', BankQuestionView.as_view(),
+            name='bank-question'),
+        path('quiz/bank/results', BankResultsView.as_view(), name='bank-results'),
         path('quiz/<int:s_id>/questions/<int:q_id>', QuestionView.as_view(), name='question'),
         path('quiz/<int:id>/results', ResultsView.as_view(), name='results'),
+        path('api/quiz/<int:id>', QuizAPIView.as_view(), name='api-quiz'),
         path('create-survey', CreateSurveyView.as_view(), name='create'),
+        path('api/surveys', CreateSurveyAPIView.as_view(), name='api-create'),
         path('surveys/list', ListSurveysView.as_view(), name='surveys'),
+        path('answers/export', ExportAnswersView.as_view(), name='export-answers'),
         path('surveys/list/<str:topic>/<int:pk>', 
             SurveyDetailsView.as_view(), 
             name='survey-detail'),
+        path('surveys/list/<str:topic>/<int:pk>/stats',
+            SurveyStatsView.as_view(),
+            name='survey-stats'),
 ]
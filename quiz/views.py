@@ -1,16 +1,44 @@
-import random, re, logging
+import json, re
 from typing import Any
-from urllib.parse import urlencode
 
+from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.views import LoginView
-from django.core.serializers import serialize, deserialize
-from django.core.exceptions import ObjectDoesNotExist
-from django.shortcuts import get_object_or_404, render, redirect, reverse
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import IntegrityError
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect, reverse
+from django.template.loader import render_to_string
+from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic import DetailView, ListView, View, RedirectView, TemplateView
 from django.views.generic.base import ContextMixin
 
+from .creation import create_survey, max_length, survey_data_from_json
+from .exports import FORMATS, answer_rows, answers_queryset, export_lines, parse_moment
 from .forms import QuestionFormSet, SurveyForm
-from .models import Choice, Question, Answer, Survey
+from .games import (
+        BANK_SIZE,
+        GAME_COOKIE,
+        GameState,
+        finish_game,
+        game_token,
+        load_game,
+        new_bank_game,
+        new_game,
+        save_game,
+        set_game_cookie,
+        )
+from .models import (
+        Choice, Question, QuestionResponse, Answer, ScoreBucket, Survey, SurveyCreationKey)
+from .pagination import annotate_counts, keyset_page
+from .plans import QUESTION_TIME, SurveyPlan
+from .pools import random_survey_id, sample_questions, warm_question_pool, warm_topic_pool
+
+FORM_FIELD = re.compile(r'(question-\d+)-(?:(choice-\d+)-)?(\w+)$')
 
 class IndexView(TemplateView):
     """ 
@@ -27,6 +55,7 @@ class IndexView(TemplateView):
             form.remove_test_option()
 
         context['survey'] = form
+        context['bank_size'] = BANK_SIZE
         context['pop_up_login'] = False
         context['failed_load_game'] = False
         
@@ -81,79 +110,219 @@ class CreateSurveyView(TemplateView):
         }
 
         for key in request.POST:
-            if 'question' not in key:
+            match = FORM_FIELD.match(key)
+            if match is None:
                 continue
-            question = re.search(r'(question-\d+)-', key).group(1)
+            question, choice, field = match.groups()
             form_data.setdefault(question, dict())
-            
-            if 'question_text' in key:
-                form_data[question]['question_text'] = request.POST[key]
 
-            if 'choice' not in key:
-                continue
+            if field == 'question_text':
+                form_data[question]['question_text'] = request.POST[key]
 
-            if 'choice_text' in key:
-                choice = re.search(r'(choice-\d+)-', key).group(1)
+            if field == 'choice_text' and choice:
                 form_data[question].setdefault(choice, {'is_correct': False})
                 form_data[question][choice]['choice_text'] = request.POST[key]
 
-            if 'choice_set' in key:
+            if field == 'choice_set':
                 correct_choice = request.POST[key]
-                form_data[question].update({correct_choice:{'is_correct':True}})
+                form_data[question].setdefault(correct_choice, {})
+                form_data[question][correct_choice]['is_correct'] = True
 
         return form_data
 
     def post(self, request, *args, **kwargs):
         form_data = self.process_request(request)
-        form_data = Survey.from_form(form_data)
-        form_data = Question.from_form(form_data)
-        Choice.from_form(form_data)
+        try:
+            create_survey(form_data)
+        except ValidationError as error:
+            context = self.get_context_data(**kwargs)
+            context['errors'] = error.messages
+            return render(request, self.template_name, context, status=400)
 
         return redirect('surveys')
 
+@method_decorator(ensure_csrf_cookie, name='get')
+class CreateSurveyAPIView(View):
+    """
+    JSON version of CreateSurveyView for authoring tools. The body uses the
+    layout described in quiz.creation.survey_data_from_json, an optional
+    Idempotency-Key header makes retries return the survey already created.
+    The POST is authenticated by the session, so it needs the CSRF token: a
+    GET returns the topics and sets the csrftoken cookie, which is sent back
+    in the X-CSRFToken header.
+    """
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'topics': dict(Survey.SurveyTopics.choices)})
+
+    def existing_survey(self, key: str | None) -> int | None:
+        if not key:
+            return None
+        return (SurveyCreationKey.objects
+                .filter(user=self.request.user, key=key)
+                .values_list('survey_id', flat=True).first())
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'errors': ['authentication required']}, status=401)
+
+        key = request.headers.get('Idempotency-Key')
+        limit = max_length(SurveyCreationKey, 'key')
+        if key and len(key) > limit:
+            return JsonResponse(
+                    {'errors': [f'Idempotency-Key is longer than {limit} characters']},
+                    status=400)
+        if (survey_id := self.existing_survey(key)) is not None:
+            return JsonResponse({'id': survey_id, 'created': False})
+
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            # a JSONDecodeError or a body that is not UTF-8
+            return JsonResponse({'errors': ['body is not valid JSON']}, status=400)
+
+        try:
+            survey = create_survey(
+                    survey_data_from_json(payload, request.user), key)
+        except ValidationError as error:
+            return JsonResponse({'errors': error.messages}, status=400)
+        except IntegrityError:
+            # a concurrent request with the same key won the race
+            if (survey_id := self.existing_survey(key)) is None:
+                raise
+            return JsonResponse({'id': survey_id, 'created': False})
+
+        return JsonResponse({'id': survey.pk, 'created': True}, status=201)
+
 class ListSurveysView(ListView):
+    """
+    Newest surveys first, with their question and play counts, a page at a
+    time through a keyset cursor, see quiz/pagination.py.
+    """
     model = Survey
+    template_name = 'quiz/survey_list.html'
 
     def get_context_data(self, **kwargs):
         context = super(ListSurveysView, self).get_context_data(**kwargs)
-        form = SurveyForm(initial={'name': ''})
+        form = SurveyForm(initial={'name': '', 'topic': self.topic})
 
         if not self.request.user.is_superuser:
             form.remove_test_option()
 
         context['survey'] = form
+        context['topic'] = self.topic
+        context['next_cursor'] = self.next_cursor
+        context['is_first_page'] = not self.request.GET.get('cursor')
         return context
     
     def get_queryset(self, *args, **kwargs):
-        qs = super().get_queryset(*args,**kwargs)
+        qs = annotate_counts(super().get_queryset(*args,**kwargs).select_related('user'))
         user =self.request.user
 
         if not user.is_superuser:
             qs = qs.filter(user=user)
 
-        if self.request.GET:
-            qs = qs.filter(topic=self.request.GET['topic'])
+        self.topic = self.request.GET.get('topic')
+        if self.topic not in Survey.SurveyTopics.values:
+            self.topic = None
+        if self.topic:
+            qs = qs.filter(topic=self.topic)
 
-        return qs.order_by('-creation_date')[:10]
+        page, self.next_cursor = keyset_page(qs, self.request.GET.get('cursor'))
+        return page
 
 class SurveyDetailsView(DetailView):
+    """
+    Survey with all its questions and choices. The question list is a
+    fragment cached by survey version, a large survey with a cold fragment is
+    streamed: the page head goes out first, then the questions, rendered in
+    chunks from two queries, which also fill the fragment cache.
+    """
     model = Survey
+    stream_threshold = 100
+    stream_chunk_size = 25
+    stream_marker = mark_safe('<!-- survey-detail-questions -->')
 
     def get_context_data(self, **kwargs):
         context = super(SurveyDetailsView, self).get_context_data(**kwargs)
         form = SurveyForm(initial={'name': ''})
         context['survey'] = form
         return context
-    
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        key = make_template_fragment_key(
+                'survey-detail-questions', [self.object.id, self.object.version])
+
+        if key in cache or len(Survey.get_plan(self.object.id)) <= self.stream_threshold:
+            return self.render_to_response(self.get_context_data(object=self.object))
+
+        context = self.get_context_data(
+                object=self.object, stream_marker=self.stream_marker)
+        page = render_to_string(self.get_template_names(), context, request)
+        return StreamingHttpResponse(self.stream(page, key))
+
+    def stream(self, page: str, key: str):
+        head, tail = page.split(self.stream_marker, 1)
+        yield head
+
+        questions = list(self.object.question_tree)
+        rendered = []
+        for start in range(0, len(questions), self.stream_chunk_size):
+            chunk = render_to_string(
+                    'quiz/survey_detail_questions.html',
+                    {'questions': questions[start:start + self.stream_chunk_size]})
+            rendered.append(chunk)
+            yield chunk
+
+        cache.set(key, mark_safe(''.join(rendered)), 86400)
+        yield tail
+
     def post(self, request, *args, **kwargs):
-        qs = self.get_queryset()
-        survey = self.get_object(qs)
-        status = request.POST['status']
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        survey = self.get_object()
+        try:
+            survey.status = Survey.StateSurvey(int(request.POST['status']))
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest("invalid status")
+
+        survey.save(update_fields=['status'])
+        return redirect('survey-detail', topic=survey.topic, pk=survey.pk)
+
+
+class SurveyStatsView(DetailView):
+    """
+    Per question statistics of a survey for its author and the superusers,
+    read from the precomputed QuestionStats and ChoiceStats rows and from
+    the last item analysis, see quiz/analytics.py.
+    """
+    model = Survey
+    template_name = 'quiz/survey_stats.html'
 
-        survey.status = status
-        survey.save()
+    def get_queryset(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return Survey.objects.none()
+        if user.is_superuser:
+            return Survey.objects.all()
+        return Survey.objects.filter(user=user)
 
-        return self.get(request, *args, *kwargs)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        questions = (Question.objects.filter(survey=self.object).order_by('id')
+                .select_related('stats', 'analysis')
+                .prefetch_related(Prefetch(
+                    'choice_set',
+                    Choice.objects.select_related('stats', 'analysis').order_by('id'))))
+
+        context['questions'] = [
+            (question,
+             getattr(question, 'stats', None),
+             getattr(question, 'analysis', None),
+             [(choice, getattr(choice, 'stats', None), getattr(choice, 'analysis', None))
+                 for choice in question.choice_set.all()])
+            for question in questions]
+        return context
 
 
 class StartView(RedirectView):
@@ -163,14 +332,26 @@ class StartView(RedirectView):
     """
     pattern_name = 'survey'
 
-    def get_random_survey_from_topic(self,topic):
-        surveys = list(Survey.objects.filter(
-                topic=topic,
-                status=1))                              # Only accepted surveys
-        return None if not surveys else random.choice(surveys)
+    def get_random_survey_from_topic(self,topic) -> SurveyPlan | None:
+        """
+        Pick an id from the cached pool of the topic and return its plan. A
+        stale id means the pool missed an update, so it is rebuilt once.
+        """
+        for _ in range(2):
+            survey_id = random_survey_id(topic)
+            if survey_id is None:
+                return None
+
+            plan = Survey.get_plan(survey_id)
+            if (plan is not None and plan.topic == topic
+                    and plan.status == Survey.StateSurvey.ACCEPTED):
+                return plan
+
+            warm_topic_pool(topic)
+        return None
 
     def questions_id(self, survey):
-        return [q.id for q in survey.questions]
+        return list(survey.plan.question_ids)
 
     def get_redirect_url(self, *args, **kwargs):
         topic = self.request.POST.get('topic')
@@ -179,9 +360,16 @@ class StartView(RedirectView):
         if not survey:
             return "/?failed=1"
 
-        self.request.session['answers'] = {}
+        self.game_token = new_game(survey.survey_id)
 
-        return reverse(self.pattern_name, kwargs={"id":survey.id})
+        return reverse(self.pattern_name, kwargs={"id":survey.survey_id})
+
+    def get(self, request, *args, **kwargs):
+        self.game_token = None
+        response = super().get(request, *args, **kwargs)
+        if self.game_token:
+            set_game_cookie(response, self.game_token)
+        return response
 
 class SurveyView(ContextMixin, View):
     """
@@ -196,9 +384,16 @@ class SurveyView(ContextMixin, View):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        survey = get_object_or_404(Survey, pk=self.survey_id)
-        next_question = survey.next_question()
-        context['question_url'] = f"{self.survey_id}/questions/{next_question.id}" 
+        plan = Survey.get_plan(self.survey_id)
+        if plan is None or not plan.question_ids:
+            raise Http404("Survey not found or without questions")
+
+        game = load_game(game_token(self.request))
+        if game is not None and game.survey_id == self.survey_id:
+            next_question = game.next_question_id(plan=plan)
+        else:
+            next_question = plan.next_question_id()
+        context['question_url'] = f"{self.survey_id}/questions/{next_question}" 
         return context
 
     def get(self, request, *args, **kwargs):
@@ -208,61 +403,259 @@ class SurveyView(ContextMixin, View):
 class QuestionView(ContextMixin,View):
     """
     This view is the heart of the app, provides the quiz, and stores 
-    into session data the answers of the users.
+    into the game state the answers of the users.
     """
     def setup(self, request, *args,**kwargs):
         """ Create the context on initialization. """
         super().setup(request,*args,**kwargs)
-        self.survey_id = kwargs.get('s_id')
+        self.game_token = game_token(request)
+        self.game = load_game(self.game_token)
         self.question_id = kwargs.get('q_id')
+        self.survey_id = self.get_survey_id()
         self.context = self.get_context_data(**kwargs)
 
+    def get_survey_id(self) -> int | None:
+        return self.kwargs.get('s_id')
+
+    def is_playing(self) -> bool:
+        """ The player has a game of this survey in progress. """
+        return self.game is not None and self.game.survey_id == self.survey_id
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        survey = get_object_or_404(Survey, pk = self.survey_id)
-        question = get_object_or_404(Question, pk=self.question_id)
+        plan = Survey.get_plan(self.survey_id)
+        if plan is None or self.question_id not in plan:
+            raise Http404("Question not found in survey")
 
+        question = plan.question(self.question_id)
+        seed = self.game.seed if self.is_playing() else None
+        order = plan.choice_order(self.question_id, seed)
         context['question'] = question
-        context['survey'] = survey
+        context['choices'] = [question.choices[i] for i in order]
+        context['choice_order'] = '-'.join(map(str, order))
+        context['question_time'] = QUESTION_TIME
+        context['survey'] = plan
         
         return context
 
-    def quiz_ended(self):
-        answers = self.request.session.pop('answers', None)
+    def quiz_ended(self, token: str, game: GameState):
         user = self.request.user
+        finish_game(token)
 
-        if answers is None:
-            return redirect('index')
-        
-        score = sum(n for n in answers.values())
+        score = game.total
         if user.is_authenticated:
-            Answer.objects.create(
-                user=user, survey=self.context['survey'], score=score)
+            answer = Answer.record(user, self.survey_id, score, game.picks)
+            self.request.session['score_pending'] = answer.is_pending
 
         self.request.session['score'] = score
-        return redirect('results', id = self.survey_id)
+        response = redirect('results', id = self.survey_id)
+        response.delete_cookie(GAME_COOKIE)
+        return response
+
+    def question_redirect(self, q_id: int):
+        return redirect('question', s_id = self.survey_id, q_id = q_id)
 
     def get(self, request, *args, **kwargs):
         return render(request, 'quiz/quiz.html', self.context)
 
+    def play(self, game: GameState) -> None:
+        """ Score the pick of the player and keep it in the game state. """
+        plan = self.context['survey']
+        choice = int(self.request.POST.get('choice') or 0)
+        timer = int(self.request.POST.get('timerVal') or 0)
+        game.play(self.question_id, choice, timer,
+                plan.score(self.question_id, choice, timer))
+
     def post(self, request, *args, **kwargs):
-        answers: dict[int, int]  = request.session.pop('answers')
+        if not self.is_playing():
+            return redirect('index')
 
-        question = self.context["question"]
-        score = question.score(
-            int(request.POST.get('choice') or 0),
-            int(request.POST.get('timerVal' or 0)))
+        # the questions are answered in the order of the game, a replayed or
+        # skipped question goes back to the current one
+        plan = self.context['survey']
+        current = self.game.current_question_id(plan)
+        if current is None:
+            return redirect('index')
+        if current != self.question_id:
+            return self.question_redirect(current)
 
-        answers.update({question.id: score})
+        self.play(self.game)
+        next_question = self.game.next_question_id(self.question_id, plan)
+        if next_question is None:
+            return self.quiz_ended(self.game_token, self.game)
 
-        request.session['answers'] = answers
+        save_game(self.game_token, self.game)
 
-        next_question = self.context['survey'].next_question(self.question_id)
-        if next_question is None:
-            return self.quiz_ended()
+        return self.question_redirect(next_question)
+
+class BankStartView(StartView):
+    """
+    Start a question bank game: BANK_SIZE distinct questions sampled from
+    every accepted survey of the topic, played in a random order.
+    """
+    pattern_name = 'bank'
+
+    def sample(self, topic: str) -> list[tuple[int, int]] | None:
+        """
+        Sample the questions from the cached pool of the topic. A question
+        whose survey plan does not have it anymore means the pool missed an
+        update, so it is rebuilt once.
+        """
+        for _ in range(2):
+            questions = sample_questions(topic, BANK_SIZE)
+            plans = {s_id: Survey.get_plan(s_id) for s_id, _ in questions}
+            if all(plans[s_id] is not None and q_id in plans[s_id]
+                    and plans[s_id].topic == topic
+                    and plans[s_id].status == Survey.StateSurvey.ACCEPTED
+                    for s_id, q_id in questions):
+                return questions or None
+
+            warm_question_pool(topic)
+        return None
+
+    def get_redirect_url(self, *args, **kwargs):
+        topic = self.request.POST.get('topic')
+        questions = self.sample(topic) if topic in Survey.SurveyTopics.values else None
+        if not questions:
+            return "/?failed=1"
 
-        return redirect('question', s_id = self.survey_id, q_id = next_question.id)
+        self.game_token = new_bank_game(topic, questions)
+        return reverse(self.pattern_name)
+
+class BankView(View):
+    """ Get ready message of a question bank game, as SurveyView. """
+    def get(self, request, *args, **kwargs):
+        game = load_game(game_token(request))
+        if game is None or not game.is_bank:
+            return redirect('index')
+
+        question_url = reverse('bank-question', kwargs={'q_id': game.next_question_id()})
+        return render(request, 'quiz/survey.html', {'question_url': question_url})
+
+class BankQuestionView(QuestionView):
+    """
+    A question of a bank game, rendered and scored with the cached plan of
+    the survey that owns it, so a step costs the same as in a survey game.
+    """
+    def get_survey_id(self) -> int | None:
+        if self.game is None or not self.game.is_bank:
+            raise Http404("Game not found")
+
+        survey_id = self.game.source(self.question_id)
+        if survey_id is None:
+            raise Http404("Question not found in game")
+        return survey_id
+
+    def is_playing(self) -> bool:
+        """ The game was checked by get_survey_id. """
+        return True
+
+    def quiz_ended(self, token: str, game: GameState):
+        """
+        Bank games belong to no survey, so they are not stored as answers
+        and stay out of the leaderboards, only the results page shows them.
+        """
+        finish_game(token)
+        correct = 0
+        for s_id, q_id in game.questions:
+            plan = Survey.get_plan(s_id)
+            if plan is None or q_id not in game.picks:
+                continue
+            # the same rule as the responses of a recorded attempt
+            responses = QuestionResponse.from_picks(plan, {q_id: game.picks[q_id]})
+            correct += any(response.is_correct for response in responses)
+
+        self.request.session['score'] = game.total
+        self.request.session['bank_result'] = {
+            'topic': game.topic, 'correct': correct, 'questions': len(game.questions)}
+        response = redirect('bank-results')
+        response.delete_cookie(GAME_COOKIE)
+        return response
+
+    def question_redirect(self, q_id: int):
+        return redirect('bank-question', q_id=q_id)
+
+class BankResultsView(View):
+    """ Score of a finished question bank game. """
+    def get(self, request, *args, **kwargs):
+        score = request.session.pop('score', None)
+        result = request.session.pop('bank_result', None)
+        if score is None or result is None:
+            return redirect('index')
+
+        return render(request, 'quiz/bank_results.html', {
+            'score': score,
+            'topic': result['topic'],
+            'topic_label': Survey.SurveyTopics(result['topic']).label,
+            'correct': result['correct'],
+            'questions': result['questions'],
+        })
+
+@method_decorator(ensure_csrf_cookie, name='get')
+class QuizAPIView(View):
+    """
+    Single round trip version of the quiz. A GET starts a game, like
+    StartView, and returns the whole playable survey without the answer key.
+    It also sets the csrftoken cookie, the POST sends it back in the
+    X-CSRFToken header.
+    The client plays it locally and POSTs every pick at once:
+
+        {"answers": [{"question": id, "choice": id, "timer": seconds}, ...]}
+
+    The attempt is scored in one pass against the cached SurveyPlan and ends
+    the game, only the total is returned so the answer key cannot be probed
+    a choice at a time. The HTML flow of SurveyView and QuestionView keeps
+    working as a fallback.
+    """
+    def get_plan(self) -> SurveyPlan:
+        plan = Survey.get_plan(self.kwargs['id'])
+        if plan is None:
+            raise Http404("Survey not found")
+        return plan
+
+    def get(self, request, *args, **kwargs):
+        plan = self.get_plan()
+        response = JsonResponse(plan.playable())
+        set_game_cookie(response, new_game(plan.survey_id))
+        return response
+
+    def parse_picks(self) -> dict[int, tuple[int, int]]:
+        answers = json.loads(self.request.body).get('answers')
+        if not isinstance(answers, list):
+            raise ValueError("answers must be a list")
+
+        return {
+            int(answer['question']): (
+                int(answer.get('choice') or 0), int(answer.get('timer') or 0))
+            for answer in answers}
+
+    def post(self, request, *args, **kwargs):
+        plan = self.get_plan()
+        token = game_token(request)
+        game = load_game(token)
+        if game is None or game.survey_id != plan.survey_id:
+            return JsonResponse({'errors': ["no game of this survey in progress"]}, status=400)
+
+        try:
+            picks = self.parse_picks()
+            scores = plan.score_attempt(picks)
+        except (ValueError, TypeError, KeyError, AttributeError) as error:
+            return JsonResponse({'errors': [str(error)]}, status=400)
+
+        finish_game(token)
+        score = sum(scores.values())
+        if request.user.is_authenticated:
+            answer = Answer.record(request.user, plan.survey_id, score, picks)
+            request.session['score_pending'] = answer.is_pending
+
+        request.session['score'] = score
+        response = JsonResponse({
+            'score': score,
+            'results_url': reverse('results', kwargs={'id': plan.survey_id}),
+        })
+        response.delete_cookie(GAME_COOKIE)
+        return response
 
 class ResultsView(ContextMixin, View):
     """ 
@@ -278,11 +671,55 @@ class ResultsView(ContextMixin, View):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['score'] = self.request.session.pop('score', None)
-        context['survey'] = get_object_or_404(Survey, pk=self.survey_id)
-        context['top5'] = Answer.top_n_answers(5, context['survey'])
+        pending = self.request.session.pop('score_pending', False)
+        context['survey'] = Survey.get_plan(self.survey_id)
+        if context['survey'] is None:
+            raise Http404("Survey not found")
+
+        context['top5'] = Answer.top_n_answers(5, self.survey_id)
+
+        if context['score'] is not None:
+            context['standing'] = ScoreBucket.standing(
+                    context['score'], survey_id=self.survey_id, pending=pending)
+            context['topic_standing'] = ScoreBucket.standing(
+                    context['score'], topic=context['survey'].topic, pending=pending)
         return context
 
     def get(self, request, *args, **kwargs):
         if self.context.get('score') is None:
             return redirect('index')
         return render(request, 'quiz/results.html', self.context)
+
+
+class ExportAnswersView(UserPassesTestMixin, View):
+    """
+    Staff only download of the Answer history as CSV or JSON lines. Accepts
+    the format, survey, topic, since and until query parameters, the rows
+    are streamed as they are read from the database.
+    """
+    raise_exception = True
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in FORMATS:
+            return JsonResponse({'errors': [f"unknown format {fmt!r}"]}, status=400)
+
+        try:
+            survey = request.GET.get('survey')
+            filters = {
+                'survey': int(survey) if survey else None,
+                'topic': request.GET.get('topic') or None,
+                'since': parse_moment(request.GET['since']) if request.GET.get('since') else None,
+                'until': parse_moment(request.GET['until']) if request.GET.get('until') else None,
+            }
+        except ValueError as error:
+            return JsonResponse({'errors': [str(error)]}, status=400)
+
+        rows = answer_rows(answers_queryset(**filters))
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_lines(rows, fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="answers.{fmt}"'
+        return response
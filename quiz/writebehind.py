@@ -0,0 +1,154 @@
+"""
+Write-behind buffer for the answers of finished quizzes.
+
+With QUIZ_WRITE_BEHIND on, Answer.record does not insert the row inside the
+request: the answer goes into a bounded in-process queue and a background
+thread stores the queued answers and their question responses with one
+bulk_create each per batch, then merges them into the question statistics,
+the leaderboards and the score histograms.
+
+The player's score travels in the session and the rank is read from the
+histograms of the other players, so the results page does not wait for the
+insert. The leaderboard shows the new answer within FLUSH_INTERVAL.
+
+When the queue is full a request waits up to PUT_TIMEOUT for room and then
+writes synchronously, so a slow database slows the players down instead of
+growing the queue without bound. The queue is flushed when the process
+exits; answers still queued when the process is killed are lost.
+"""
+import atexit
+import logging
+import queue
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, NamedTuple
+
+from django.db import close_old_connections, connection, transaction
+
+if TYPE_CHECKING:
+    from .models import Answer, QuestionResponse
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+PUT_TIMEOUT = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class PendingAnswer(NamedTuple):
+    answer: 'Answer'
+    username: str
+    topic: str
+    responses: list['QuestionResponse']
+
+
+class AnswerBuffer:
+    def __init__(self, maxsize: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE) -> None:
+        self.queue: queue.Queue[PendingAnswer] = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.stopping = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                        target=self.run, name='answer-write-behind', daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def offer(self, pending: PendingAnswer, block: bool = True) -> bool:
+        """ Queue the answer, False if the queue stayed full. """
+        try:
+            self.queue.put(pending, block=block, timeout=PUT_TIMEOUT)
+        except queue.Full:
+            return False
+        return True
+
+    def take_batch(self, timeout: float = 0.0) -> list[PendingAnswer]:
+        """ Up to batch_size answers, waiting up to timeout for the first one. """
+        try:
+            batch = [self.queue.get(timeout=timeout) if timeout else self.queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self) -> None:
+        while not self.stopping.is_set():
+            batch = self.take_batch(FLUSH_INTERVAL)
+            if batch:
+                self.write(batch)
+                close_old_connections()
+        connection.close()
+
+    def flush(self) -> int:
+        """ Write every queued answer in the calling thread. """
+        written = 0
+        while batch := self.take_batch():
+            self.write(batch)
+            written += len(batch)
+        return written
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.flush()
+
+    def write(self, batch: list[PendingAnswer]) -> None:
+        """ Insert the batch and add it to the histograms in one transaction. """
+        from .leaderboards import record_score
+        from .models import Answer, QuestionResponse, QuestionStats
+
+        try:
+            with transaction.atomic():
+                Answer.objects.bulk_create([p.answer for p in batch])
+                responses = []
+                for p in batch:
+                    for response in p.responses:
+                        response.answer = p.answer
+                    responses += p.responses
+                QuestionResponse.objects.bulk_create(responses)
+                QuestionStats.add_responses(responses)
+                self.add_scores(batch)
+        except Exception:
+            logger.exception("bulk insert of %d answers failed, inserting one by one", len(batch))
+            batch = self.write_one_by_one(batch)
+            self.add_scores(batch)
+
+        for p in batch:
+            record_score(p.answer.survey_id, p.answer.pk, p.answer.score, p.username)
+
+    def add_scores(self, batch: list[PendingAnswer]) -> None:
+        """ One histogram update per distinct score instead of one per answer. """
+        from .models import ScoreBucket
+
+        buckets = Counter((p.answer.survey_id, p.topic, p.answer.score) for p in batch)
+        for (survey_id, topic, score), n in buckets.items():
+            ScoreBucket.add_score(survey_id, topic, score, n)
+
+    def write_one_by_one(self, batch: list[PendingAnswer]) -> list[PendingAnswer]:
+        from .models import Answer
+
+        written = []
+        for p in batch:
+            p.answer.pk = None
+            for response in p.responses:
+                response.pk = None
+            try:
+                Answer.save_with_responses(p.answer, p.responses)
+            except Exception:
+                logger.exception("answer of %s to survey %s lost", p.username, p.answer.survey_id)
+            else:
+                written.append(p)
+        return written
+
+
+answer_buffer = AnswerBuffer()